@@ -0,0 +1,314 @@
+import asyncio
+import collections
+import random
+import sys
+import time
+
+from channels import DEFAULT_ROOM, ChannelManager, room_group
+from client import ASCII_ART
+from protocol import (CHAT, CONTROL, HISTORY, HISTORY_END, NICK_TAKEN, SEQ, SERVER_SHUTDOWN, STATS,
+                      FrameDecoder, ProtocolError, decode_text, encode_frame, encode_join, parse_shutdown)
+
+# replayed: wiadomość pochodzi z powtórki historii (między HISTORY a HISTORY_END), a nie została właśnie wysłana.
+ChatMessage = collections.namedtuple('ChatMessage', 'transport message_type text received_ns room replayed',
+                                     defaults=(None, False))
+
+
+class NickTakenError(Exception):
+    pass
+
+
+class _DatagramQueue(asyncio.DatagramProtocol):
+    def __init__(self, client, transport_name):
+        self.client = client
+        self.transport_name = transport_name
+
+    def datagram_received(self, data, addr):
+        self.client._on_datagram(self.transport_name, data)
+
+
+class AsyncClient:
+    def __init__(self, nickname, server_ip='127.0.0.1', server_port=5660, multi_port=5661,
+                 multicast=True, reconnect=True, backoff_initial=0.5, backoff_max=30.0, queue_size=10000,
+                 rooms=(DEFAULT_ROOM,)):
+        self.nickname = nickname
+        self.server_ip = server_ip
+        self.server_port = server_port
+        self.multi_port = multi_port
+        self.multicast = multicast
+        self.reconnect = reconnect
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+
+        self.reader = None
+        self.writer = None
+        self.decoder = None
+        self.udp_transport = None
+        self.multi_transport = None
+        # Gniazdo multicastu powstaje tylko dla klientów odbierających multicast albo przy pierwszym wysłaniu na grupę.
+        self.channels = ChannelManager(multi_port) if multicast else None
+        self._multicast_opening = None
+        self.rooms = rooms
+        self.connected = asyncio.Event()
+        self.closed = False
+        self.reconnects = 0
+        self.dropped = 0
+        # Numer ostatniej wiadomości z historii serwera (ze znaczników SEQ); po ponownym połączeniu serwer dośle tylko nowsze.
+        self.history_seq = None
+        self.replaying = False
+        # Opóźnienie podane przez serwer w SERVER_SHUTDOWN zastępuje pierwszy krok backoffu.
+        self._reconnect_delay = None
+        self._messages = asyncio.Queue(queue_size)
+        self._run_task = None
+
+    async def connect(self):
+        await self._open()
+        await self._open_multicast()
+        self._run_task = asyncio.create_task(self._run())
+
+    async def _open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.server_ip, self.server_port)
+        self.decoder = FrameDecoder()
+        self.replaying = False
+        try:
+            self.writer.write(encode_join(self.nickname, self.history_seq))
+            await self.writer.drain()
+            if await self._read_handshake() == NICK_TAKEN:
+                raise NickTakenError(f"Nick {self.nickname} jest już zajęty.")
+
+            _, tcp_port = self.writer.get_extra_info('sockname')[:2]
+            self.udp_transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                lambda: _DatagramQueue(self, 'udp'), local_addr=(self.server_ip, tcp_port))
+        except BaseException:
+            self.writer.close()
+            raise
+        self.connected.set()
+
+    async def _open_multicast(self):
+        if not self.multicast:
+            return
+        self.channels.bind()
+        for room in self.rooms:
+            self.channels.join(room)
+        await self._open_multicast_transport()
+
+    async def _open_multicast_transport(self):
+        self.channels.socket.setblocking(False)
+        self.multi_transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+            lambda: _DatagramQueue(self, 'multicast'), sock=self.channels.socket)
+
+    async def _open_multicast_sender(self):
+        # Klient z multicast=False tylko wysyła na grupę, więc wystarcza mu niezwiązane gniazdo.
+        if self._multicast_opening is None:
+            self.channels = ChannelManager(self.multi_port)
+            self._multicast_opening = asyncio.ensure_future(self._open_multicast_transport())
+        await self._multicast_opening
+
+    def join(self, room):
+        if not self.multicast:
+            raise RuntimeError("Odbiór multicastu jest wyłączony (multicast=False).")
+        self.channels.join(room)
+
+    def leave(self, room):
+        if not self.multicast:
+            raise RuntimeError("Odbiór multicastu jest wyłączony (multicast=False).")
+        self.channels.leave(room)
+
+    async def _read_handshake(self):
+        while True:
+            data = await self.reader.read(65536)
+            if not data:
+                raise ConnectionError("Serwer zamknął połączenie.")
+            self.decoder.feed(data)
+            frames = self.decoder.frames()
+            for _, payload in frames:
+                response = decode_text(payload)
+                for message_type, payload in frames:
+                    self._on_frame(message_type, payload)
+                return response
+
+    async def _run(self):
+        while not self.closed:
+            try:
+                await self._read_tcp()
+            except (OSError, ProtocolError):
+                pass
+            self._close_server_transports()
+            if self.closed or not self.reconnect:
+                break
+            await self._reconnect()
+        self._put(None)
+
+    async def _read_tcp(self):
+        while True:
+            data = await self.reader.read(65536)
+            if not data:
+                return
+            self.decoder.feed(data)
+            for message_type, payload in self.decoder.frames():
+                if not self._on_frame(message_type, payload):
+                    return
+
+    async def _reconnect(self):
+        delay = self.backoff_initial
+        hinted, self._reconnect_delay = self._reconnect_delay, None
+        while not self.closed:
+            if hinted is not None:
+                await asyncio.sleep(hinted)
+                hinted = None
+            else:
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+            try:
+                await self._open()
+                self.reconnects += 1
+                return
+            except (OSError, NickTakenError, ProtocolError):
+                delay = min(delay * 2, self.backoff_max)
+
+    def _on_frame(self, message_type, payload):
+        text = decode_text(payload)
+        if message_type == CONTROL:
+            command, _, argument = text.partition(' ')
+            if command == SEQ and argument.isdigit():
+                self.history_seq = int(argument)
+            elif command == HISTORY:
+                self.replaying = True
+            elif command == HISTORY_END and argument.isdigit():
+                self.replaying = False
+                self.history_seq = int(argument)
+            elif command == SERVER_SHUTDOWN:
+                address, self._reconnect_delay = parse_shutdown(text)
+                if address is not None:
+                    self.server_ip, self.server_port = address
+                return False
+            elif text.startswith(f"{STATS}\n"):
+                self._put(ChatMessage('tcp', CONTROL, text[len(STATS) + 1:], time.monotonic_ns()))
+            return True
+        self._put(ChatMessage('tcp', message_type, text, time.monotonic_ns(), replayed=self.replaying))
+        return True
+
+    def _on_datagram(self, transport_name, data):
+        if transport_name == 'multicast':
+            received = self.channels.decode(data)
+            if received is not None:
+                room, text = received
+                self._put(ChatMessage(transport_name, CHAT, text, time.monotonic_ns(), room))
+            return
+        self._put(ChatMessage(transport_name, CHAT, decode_text(data), time.monotonic_ns()))
+
+    def _put(self, message):
+        try:
+            self._messages.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def _close_server_transports(self):
+        self.connected.clear()
+        if self.writer is not None:
+            self.writer.close()
+        if self.udp_transport is not None:
+            self.udp_transport.close()
+            self.udp_transport = None
+
+    async def messages(self):
+        while True:
+            message = await self._messages.get()
+            if message is None:
+                return
+            yield message
+
+    async def send(self, text, transport='tcp', room=DEFAULT_ROOM):
+        message = f"{self.nickname}: {text}".encode('utf-8')
+        if transport == 'tcp':
+            await self.connected.wait()
+            self.writer.write(encode_frame(CHAT, message))
+            await self.writer.drain()
+        elif transport == 'udp':
+            await self.connected.wait()
+            self.udp_transport.sendto(message, (self.server_ip, self.server_port))
+        elif transport == 'multicast':
+            if not self.multicast:
+                await self._open_multicast_sender()
+            self.multi_transport.sendto(self.channels.encode(room, message), (room_group(room), self.multi_port))
+        else:
+            raise ValueError(f"Nieznany transport: {transport}")
+
+    async def request_stats(self):
+        # Odpowiedź serwera trafia do messages() jako ChatMessage z typem CONTROL.
+        await self.connected.wait()
+        self.writer.write(encode_frame(CONTROL, STATS))
+        await self.writer.drain()
+
+    async def close(self):
+        self.closed = True
+        self._close_server_transports()
+        if self.multi_transport is not None:
+            self.multi_transport.close()
+        if self._run_task is not None:
+            self._run_task.cancel()
+            try:
+                await self._run_task
+            except asyncio.CancelledError:
+                pass
+            self._put(None)
+
+
+async def _stdin_lines():
+    loop = asyncio.get_running_loop()
+    if sys.platform == 'win32':
+        while True:
+            line = await loop.run_in_executor(None, sys.stdin.readline)
+            if not line:
+                return
+            yield line.rstrip('\n')
+
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    while line := await reader.readline():
+        yield line.decode('utf-8').rstrip('\n')
+
+
+async def _print_messages(client):
+    async for message in client.messages():
+        room = f" #{message.room}" if message.room else ''
+        print(f"[{message.transport.upper()}{room}] {message.text}")
+
+
+async def main():
+    print('Klient wystartował!')
+    while True:
+        nickname = input("Ustaw nick: ")
+        client = AsyncClient(nickname)
+        try:
+            await client.connect()
+            break
+        except NickTakenError:
+            print("Nick jest już zajęty, wybierz inny.")
+
+    printer = asyncio.create_task(_print_messages(client))
+    sending_mode = 'tcp'
+    room = DEFAULT_ROOM
+    async for line in _stdin_lines():
+        if line == 'U':
+            await client.send(f"\n {ASCII_ART}", 'udp')
+        elif line == 'T':
+            sending_mode = 'tcp'
+        elif line == 'M':
+            sending_mode = 'multicast'
+        elif line == '/stats':
+            await client.request_stats()
+        elif line.startswith('/join '):
+            room = line[len('/join '):].strip() or DEFAULT_ROOM
+            client.join(room)
+            sending_mode = 'multicast'
+        elif line.startswith('/leave '):
+            client.leave(line[len('/leave '):].strip())
+        else:
+            await client.send(line, sending_mode, room)
+
+    await client.close()
+    await printer
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+import argparse
+import multiprocessing
+import os
+import selectors
+import socket
+import sys
+import threading
+import time
+
+from protocol import JOIN, FrameDecoder, encode_frame
+from server import Server
+
+
+def run_server(port, batch_size):
+    sys.stdout = open(os.devnull, 'w')
+    server = Server(udp_batch_size=batch_size)
+    server.server_port = port
+    server.start_server()
+
+
+def connect_peer(host, port, nickname):
+    tcp_socket = socket.create_connection((host, port))
+    tcp_socket.sendall(encode_frame(JOIN, nickname))
+    decoder = FrameDecoder()
+    while next(decoder.frames(), None) is None:
+        if not decoder.recv_from(tcp_socket):
+            raise ConnectionError(f"Serwer odrzucił połączenie {nickname}")
+
+    _, tcp_port = tcp_socket.getsockname()
+    udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    udp_socket.bind((host, tcp_port))
+    udp_socket.setblocking(False)
+    return tcp_socket, udp_socket
+
+
+def receive(sockets, expected, idle_timeout, result):
+    selector = selectors.DefaultSelector()
+    for sock in sockets:
+        selector.register(sock, selectors.EVENT_READ)
+    buffer = bytearray(65536)
+    received = 0
+    first = last = None
+    while received < expected:
+        events = selector.select(idle_timeout)
+        if not events:
+            break
+        for key, _ in events:
+            try:
+                while True:
+                    key.fileobj.recv_into(buffer)
+                    received += 1
+            except BlockingIOError:
+                pass
+        last = time.perf_counter()
+        if first is None:
+            first = last
+    result.update(received=received, first=first, last=last)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark przekaźnika UDP serwera czatu.")
+    parser.add_argument('--port', type=int, default=5690)
+    parser.add_argument('--receivers', type=int, default=20)
+    parser.add_argument('--count', type=int, default=20000, help="liczba datagramów wysłanych przez nadawcę")
+    parser.add_argument('--size', type=int, default=512, help="rozmiar datagramu w bajtach")
+    parser.add_argument('--rate', type=float, default=0, help="datagramy/s (0 = bez limitu)")
+    parser.add_argument('--batch-size', type=int, default=64)
+    args = parser.parse_args()
+
+    host = '127.0.0.1'
+    server_process = multiprocessing.Process(target=run_server, args=(args.port, args.batch_size), daemon=True)
+    server_process.start()
+    time.sleep(0.5)
+
+    try:
+        peers = [connect_peer(host, args.port, f"bench{i}") for i in range(args.receivers + 1)]
+        _, sender = peers[0]
+        receivers = [udp_socket for _, udp_socket in peers[1:]]
+
+        expected = args.count * args.receivers
+        result = {}
+        receiver_thread = threading.Thread(target=receive, args=(receivers, expected, 2.0, result))
+        receiver_thread.start()
+
+        sender.setblocking(True)
+        payload = b'U' * args.size
+        interval = 1 / args.rate if args.rate else 0
+        started = time.perf_counter()
+        for i in range(args.count):
+            sender.sendto(payload, (host, args.port))
+            if interval:
+                delay = started + (i + 1) * interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+        send_time = time.perf_counter() - started
+        receiver_thread.join()
+    finally:
+        server_process.terminate()
+
+    received = result['received']
+    duration = (result['last'] - started) if result['last'] else float('nan')
+    print(f"Nadawca: {args.count} datagramów po {args.size} B w {send_time:.3f} s "
+          f"({args.count / send_time:,.0f} datagramów/s)")
+    print(f"Odbiorcy: {args.receivers}, oczekiwano {expected} dostarczeń, dostarczono {received}")
+    print(f"Przepustowość przekaźnika: {received / duration:,.0f} datagramów/s")
+    print(f"Odsetek utraconych: {100 * (expected - received) / expected:.2f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+import random
+import socket
+import struct
+import sys
+import zlib
+
+from protocol import PROTOCOL_VERSION, decode_text
+
+MULTICAST_PORT = 5661
+DEFAULT_ROOM = 'main'
+# Domyślny pokój zostaje na dotychczasowej grupie, pozostałe trafiają do puli adresów organizacyjnych 239.192.0.0/16.
+DEFAULT_GROUP = '224.1.1.1'
+ROOM_GROUP_PREFIX = '239.192'
+
+# version (1B) | room id (4B) | sender id (4B) | UTF-8 payload
+MULTICAST_HEADER = struct.Struct('!BII')
+MAX_DATAGRAM = 65507
+
+# Bez tej opcji Linux dostarcza do gniazda datagramy wszystkich grup, do których dołączył dowolny proces na hoście.
+IP_MULTICAST_ALL = getattr(socket, 'IP_MULTICAST_ALL', 49)
+
+
+def room_id(room):
+    return zlib.crc32(room.encode('utf-8'))
+
+
+def room_group(room):
+    if room == DEFAULT_ROOM:
+        return DEFAULT_GROUP
+    rid = room_id(room)
+    return f"{ROOM_GROUP_PREFIX}.{(rid >> 8) & 0xff}.{rid & 0xff}"
+
+
+class ChannelManager:
+    def __init__(self, port=MULTICAST_PORT, interface='0.0.0.0', sender_id=None):
+        self.port = port
+        self.interface = interface
+        self.sender_id = random.getrandbits(32) if sender_id is None else sender_id
+        self.rooms = {}
+        self.groups = {}
+        self.buffer = bytearray(MAX_DATAGRAM)
+        self.view = memoryview(self.buffer)
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if sys.platform.startswith('linux'):
+            self.socket.setsockopt(socket.IPPROTO_IP, IP_MULTICAST_ALL, 0)
+
+    def bind(self):
+        self.socket.bind(('', self.port))
+
+    def join(self, room):
+        rid = room_id(room)
+        if rid in self.rooms:
+            return
+        group = room_group(room)
+        # Kilka pokoi może dzielić grupę; członkostwo w grupie zgłaszamy tylko raz.
+        if self.groups.get(group, 0) == 0:
+            self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, self._membership(group))
+        self.groups[group] = self.groups.get(group, 0) + 1
+        self.rooms[rid] = room
+
+    def leave(self, room):
+        rid = room_id(room)
+        if self.rooms.pop(rid, None) is None:
+            return
+        group = room_group(room)
+        self.groups[group] -= 1
+        if self.groups[group] == 0:
+            del self.groups[group]
+            try:
+                self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_DROP_MEMBERSHIP, self._membership(group))
+            except OSError:
+                pass
+
+    def encode(self, room, message):
+        if isinstance(message, str):
+            message = message.encode('utf-8')
+        return MULTICAST_HEADER.pack(PROTOCOL_VERSION, room_id(room), self.sender_id) + message
+
+    def send(self, room, message):
+        self.socket.sendto(self.encode(room, message), (room_group(room), self.port))
+
+    def receive(self):
+        nbytes = self.socket.recv_into(self.buffer)
+        return self.decode(self.view[:nbytes])
+
+    def decode(self, data):
+        # Zwraca (pokój, tekst) albo None dla własnych wiadomości, obcych pokoi i niepoprawnych datagramów.
+        if len(data) < MULTICAST_HEADER.size:
+            return None
+        version, rid, sender_id = MULTICAST_HEADER.unpack_from(data)
+        if version != PROTOCOL_VERSION or sender_id == self.sender_id:
+            return None
+        room = self.rooms.get(rid)
+        if room is None:
+            return None
+        return room, decode_text(data[MULTICAST_HEADER.size:])
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def close(self):
+        self.socket.close()
+
+    def _membership(self, group):
+        return struct.pack("4s4s", socket.inet_aton(group), socket.inet_aton(self.interface))
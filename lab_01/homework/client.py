@@ -1,9 +1,21 @@
 import select
 import socket
-import struct
 import threading
 import uuid
 
+from channels import DEFAULT_ROOM, MAX_DATAGRAM, ChannelManager
+from protocol import (CHAT, CONTROL, JOIN, NICK_TAKEN, RATE_LIMITED, SERVER_SHUTDOWN, STATS,
+                      FrameDecoder, decode_text, encode_frame, parse_shutdown)
+
+ASCII_ART = """
+   ____
+ /\\' .\\    _____
+/: \\___\\ / .  / \\
+\\' / . / /____/ ..\\
+ \\/___/  \\'  '\\  /
+           \\'__'\\/
+        """
+
 class Client:
     def __init__(self):
         self.client_id = str(uuid.uuid4())
@@ -13,8 +25,11 @@ class Client:
         self.nickname = None
         self.sending_mode = 'tcp'
         self.tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.tcp_decoder = FrameDecoder()
         self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.multi_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.udp_buffer = bytearray(MAX_DATAGRAM)
+        self.channels = ChannelManager(self.multi_port)
+        self.room = DEFAULT_ROOM
 
     def set_nickname(self):
         self.nickname = input("Ustaw nick: ")
@@ -27,20 +42,19 @@ class Client:
 
         self.udp_socket.bind((self.server_ip, tcp_port))
 
-        self.multi_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.multi_socket.bind(('', self.multi_port))
-        multi_req = struct.pack("4sl", socket.inet_aton('224.1.1.1'), socket.INADDR_ANY)
-        self.multi_socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, multi_req)
+        self.channels.bind()
+        self.channels.join(self.room)
 
         while self.nickname is None:
             self.set_nickname()
-            self.tcp_socket.send(self.nickname.encode('utf-8'))
-            response = self.tcp_socket.recv(1024).decode('utf-8')
-            if response == "NICK_TAKEN":
+            self.tcp_socket.sendall(encode_frame(JOIN, self.nickname))
+            response = self._receive_handshake()
+            if response == NICK_TAKEN:
                 print("Nick jest już zajęty, wybierz inny.")
                 self.nickname = None
                 self.tcp_socket.close()
                 self.tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                self.tcp_decoder = FrameDecoder()
                 self.tcp_socket.connect((self.server_ip, self.server_port))
             else:
                 break
@@ -53,7 +67,7 @@ class Client:
 
     def _receive_message(self):
         while True:
-            ready_sockets, _, _ = select.select([self.tcp_socket, self.udp_socket, self.multi_socket], [], [])
+            ready_sockets, _, _ = select.select([self.tcp_socket, self.udp_socket, self.channels], [], [])
 
             for sock in ready_sockets:
                 try:
@@ -61,47 +75,62 @@ class Client:
                         self._receive_tcp()
                     elif sock is self.udp_socket:
                         self._receive_udp()
-                    elif sock is self.multi_socket:
+                    elif sock is self.channels:
                         self._receive_multicast()
 
                 except (ConnectionResetError, ConnectionAbortedError, Exception):
                     print("Wystąpił błąd przy próbie odczytu wiadomości!")
                     exit(1)
 
+    def _receive_handshake(self):
+        while True:
+            if not self.tcp_decoder.recv_from(self.tcp_socket):
+                raise ConnectionError("Serwer zamknął połączenie.")
+            frames = self.tcp_decoder.frames()
+            for _, payload in frames:
+                response = decode_text(payload)
+                for message_type, payload in frames:
+                    self._handle_tcp_frame(message_type, payload)
+                return response
+
     def _receive_tcp(self):
-        message = self.tcp_socket.recv(1024).decode('utf-8')
-        if message == "NICK":
-            self.tcp_socket.send(self.nickname.encode('utf-8'))
-        elif message == "NICK_TAKEN":
+        if not self.tcp_decoder.recv_from(self.tcp_socket):
+            raise ConnectionError("Serwer zamknął połączenie.")
+        for message_type, payload in self.tcp_decoder.frames():
+            self._handle_tcp_frame(message_type, payload)
+
+    def _handle_tcp_frame(self, message_type, payload):
+        message = decode_text(payload)
+        if message_type != CONTROL:
+            print("[TCP]", message)
+        elif message == NICK_TAKEN:
             print("Nick jest już zajęty, wybierz inny.")
-        elif message == "SERVER_SHUTDOWN":
-            print("Serwer zamknął połączenie.")
-            raise Exception("Serwer zamknął połączenie.")
-        else:
-            message = "[TCP] " + message
-            print(message)
+        elif message.startswith(RATE_LIMITED):
+            _, transport, seconds = message.split(' ', 2)
+            print(f"Za dużo wiadomości ({transport.upper()}), zablokowano na {seconds} s.")
+        elif message.startswith(f"{STATS}\n"):
+            print(message[len(STATS) + 1:])
+        elif message.partition(' ')[0] == SERVER_SHUTDOWN:
+            address, _ = parse_shutdown(message)
+            if address is not None:
+                print(f"Serwer zamknął połączenie, połącz się ponownie z {address[0]}:{address[1]}.")
+            else:
+                print("Serwer zamknął połączenie.")
+            raise ConnectionError("Serwer zamknął połączenie.")
 
     def _receive_udp(self):
-        message = "[UDP] " + self.udp_socket.recv(1024).decode('utf-8')
-        print(message)
+        nbytes = self.udp_socket.recv_into(self.udp_buffer)
+        print("[UDP]", decode_text(memoryview(self.udp_buffer)[:nbytes]))
 
     def _receive_multicast(self):
-        message, addr = self.multi_socket.recvfrom(1024)
-        decoded_message = message.decode('utf-8')
-        client_id, actual_message = decoded_message.split(":", 1)
-        if client_id == self.nickname:
+        received = self.channels.receive()
+        if received is None:
             return
-        print(f"[MULTI] {decoded_message}")
+        room, message = received
+        print(f"[MULTI #{room}] {message}")
 
     def get_ascii_art(self):
-        return """
-   ____
- /\\' .\\    _____
-/: \\___\\ / .  / \\
-\\' / . / /____/ ..\\
- \\/___/  \\'  '\\  /
-           \\'__'\\/
-        """
+        return ASCII_ART
 
     def _write_message(self):
         while True:
@@ -120,12 +149,28 @@ class Client:
             elif input_message == 'M':
                 self.sending_mode = 'multicast'
                 continue
+            elif input_message == '/stats':
+                self.tcp_socket.sendall(encode_frame(CONTROL, STATS))
+                continue
+            elif input_message.startswith('/join '):
+                self.room = input_message[len('/join '):].strip() or DEFAULT_ROOM
+                self.channels.join(self.room)
+                self.sending_mode = 'multicast'
+                print(f"Dołączono do pokoju #{self.room}")
+                continue
+            elif input_message.startswith('/leave '):
+                room = input_message[len('/leave '):].strip()
+                self.channels.leave(room)
+                if room == self.room:
+                    self.room = DEFAULT_ROOM
+                print(f"Opuszczono pokój #{room}")
+                continue
 
             message = f"{self.nickname}: {input_message}"
             if self.sending_mode == 'tcp':
-                self.tcp_socket.send(message.encode('utf-8'))
+                self.tcp_socket.sendall(encode_frame(CHAT, message))
             elif self.sending_mode == 'multicast':
-                self.multi_socket.sendto(message.encode('utf-8'), ('224.1.1.1', self.multi_port))
+                self.channels.send(self.room, message)
 
 
 if __name__ == '__main__':
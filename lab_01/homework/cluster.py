@@ -0,0 +1,401 @@
+import argparse
+import collections
+import multiprocessing
+import os
+import selectors
+import socket
+import struct
+import tempfile
+
+from outbound import BACKPRESSURE, DROP_OLDEST, OutboundQueue
+from protocol import HEADER, MAX_PAYLOAD, PROTOCOL_VERSION, FrameDecoder, ProtocolError, decode_text, encode_frame
+from server import Server
+
+# Typy wiadomości magistrali między shardami (ten sam nagłówek co w protocol.py).
+BUS_SUBSCRIBE = 16
+BUS_CLAIM = 17
+BUS_CLAIM_OK = 18
+BUS_CLAIM_TAKEN = 19
+BUS_RELEASE = 20
+BUS_TCP = 21
+BUS_UDP = 22
+BUS_TCP_ACK = 23
+BUS_MESSAGE_TYPES = (BUS_SUBSCRIBE, BUS_CLAIM, BUS_CLAIM_OK, BUS_CLAIM_TAKEN, BUS_RELEASE, BUS_TCP, BUS_UDP,
+                     BUS_TCP_ACK)
+# Numer, który magistrala nadaje wiadomości TCP; wspólna numeracja pozwala wznowić historię na dowolnym shardzie.
+BUS_SEQ = struct.Struct('!Q')
+# Potwierdzenie dla shardu nadawcy: jego numer publikacji i nadany numer wiadomości.
+BUS_ACK = struct.Struct('!QQ')
+BUS_MAX_PAYLOAD = MAX_PAYLOAD + HEADER.size + BUS_SEQ.size
+BUS_QUEUE_BYTES = 64 * 1024 * 1024
+# Adres nadawcy datagramu UDP przekazywany przed jego treścią (IPv4, port).
+UDP_SOURCE = struct.Struct('!4sH')
+
+
+def encode_bus_frame(message_type, payload):
+    return HEADER.pack(PROTOCOL_VERSION, message_type, len(payload)) + payload
+
+
+def bus_decoder():
+    return FrameDecoder(message_types=BUS_MESSAGE_TYPES, max_payload=BUS_MAX_PAYLOAD)
+
+
+class BusPeer:
+    __slots__ = ('sock', 'decoder', 'outbound', 'subscribed', 'nicknames')
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.decoder = bus_decoder()
+        self.outbound = OutboundQueue(sock, BUS_QUEUE_BYTES, DROP_OLDEST)
+        self.subscribed = False
+        self.nicknames = set()
+
+
+class ClusterBus:
+    def __init__(self, path):
+        self.path = path
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.selector = selectors.DefaultSelector()
+        self.peers = {}
+        self.nicknames = {}
+        self.seq = 0
+        self.running = False
+        self._pending_flush = set()
+
+    def bind(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.listener.bind(self.path)
+        self.listener.listen(socket.SOMAXCONN)
+        self.listener.setblocking(False)
+        self.selector.register(self.listener, selectors.EVENT_READ, lambda mask: self._accept())
+
+    def serve_forever(self):
+        self.running = True
+        try:
+            while self.running:
+                for key, mask in self.selector.select():
+                    key.data(mask)
+                pending, self._pending_flush = self._pending_flush, set()
+                for peer in pending:
+                    if peer.sock in self.peers:
+                        self._write(peer)
+        finally:
+            self.close()
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self.listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            sock.setblocking(False)
+            peer = BusPeer(sock)
+            self.peers[sock] = peer
+            self.selector.register(sock, selectors.EVENT_READ, lambda mask, peer=peer: self._handle_peer(peer, mask))
+
+    def _handle_peer(self, peer, mask):
+        if mask & selectors.EVENT_WRITE:
+            self._write(peer)
+        if not mask & selectors.EVENT_READ or peer.sock not in self.peers:
+            return
+        try:
+            if not peer.decoder.recv_from(peer.sock):
+                raise ConnectionError("Shard zakończył połączenie.")
+            for message_type, payload in peer.decoder.frames():
+                self._handle_bus_frame(peer, message_type, payload)
+        except BlockingIOError:
+            return
+        except (OSError, ProtocolError):
+            self._drop_peer(peer)
+
+    def _handle_bus_frame(self, peer, message_type, payload):
+        if message_type == BUS_TCP:
+            # Shard nadawcy przysyła swój numer publikacji, pozostałe shardy dostają numer w historii.
+            number, = BUS_SEQ.unpack_from(payload)
+            self.seq += 1
+            frame = encode_bus_frame(BUS_TCP, BUS_SEQ.pack(self.seq) + payload[BUS_SEQ.size:])
+            for other in self.peers.values():
+                if other is not peer and other.subscribed:
+                    self._send(other, frame)
+            self._send(peer, encode_bus_frame(BUS_TCP_ACK, BUS_ACK.pack(number, self.seq)))
+        elif message_type == BUS_UDP:
+            frame = encode_bus_frame(message_type, payload)
+            for other in self.peers.values():
+                if other is not peer and other.subscribed:
+                    self._send(other, frame)
+        elif message_type == BUS_CLAIM:
+            nickname = decode_text(payload)
+            if nickname in self.nicknames:
+                self._send(peer, encode_frame(BUS_CLAIM_TAKEN, nickname))
+            else:
+                self.nicknames[nickname] = peer
+                peer.nicknames.add(nickname)
+                self._send(peer, encode_frame(BUS_CLAIM_OK, nickname))
+        elif message_type == BUS_RELEASE:
+            nickname = decode_text(payload)
+            if self.nicknames.get(nickname) is peer:
+                del self.nicknames[nickname]
+                peer.nicknames.discard(nickname)
+        elif message_type == BUS_SUBSCRIBE:
+            peer.subscribed = True
+
+    def _send(self, peer, frame):
+        peer.outbound.push(frame)
+        self._pending_flush.add(peer)
+
+    def _write(self, peer):
+        try:
+            peer.outbound.flush()
+        except OSError:
+            self._drop_peer(peer)
+            return
+        events = selectors.EVENT_READ
+        if peer.outbound:
+            events |= selectors.EVENT_WRITE
+        self.selector.modify(peer.sock, events, self.selector.get_key(peer.sock).data)
+
+    def _drop_peer(self, peer):
+        if self.peers.pop(peer.sock, None) is None:
+            return
+        for nickname in peer.nicknames:
+            if self.nicknames.get(nickname) is peer:
+                del self.nicknames[nickname]
+        self.selector.unregister(peer.sock)
+        peer.sock.close()
+
+    def close(self):
+        self.running = False
+        for peer in list(self.peers.values()):
+            self._drop_peer(peer)
+        self.selector.close()
+        self.listener.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class ClusterServer(Server):
+    def __init__(self, bus_path, shard_id=0, **kwargs):
+        super().__init__(reuse_port=True, **kwargs)
+        self.bus_path = bus_path
+        self.shard_id = shard_id
+        self.bus_socket = None
+        self.bus_decoder = bus_decoder()
+        self.bus_outbound = None
+        self.bus_rpc = None
+        self.bus_rpc_decoder = bus_decoder()
+        self.bus_rpc_outbound = None
+        # Wiadomości TCP wysłane do magistrali, które czekają na numer: (numer publikacji, ramka, nadawca).
+        self._unacked = collections.deque()
+        self._published = 0
+        # Klienci czekający na odpowiedź magistrali na BUS_CLAIM, w kolejności wysłania rezerwacji.
+        self._claims = collections.deque()
+
+    def start_server(self):
+        try:
+            self._connect_bus()
+        except OSError:
+            self.log.event('bus_connect_failed', shard=self.shard_id, path=self.bus_path)
+            self.log.close()
+            return
+        super().start_server()
+
+    def _connect_bus(self):
+        self.bus_rpc = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.bus_rpc.connect(self.bus_path)
+        self.bus_rpc.setblocking(False)
+        # Rezerwacji i zwolnień nicków nie wolno gubić, bo odpowiedzi dopasowujemy do _claims po kolejności.
+        self.bus_rpc_outbound = OutboundQueue(self.bus_rpc, BUS_QUEUE_BYTES, BACKPRESSURE)
+        self.selector.register(self.bus_rpc, selectors.EVENT_READ, self._handle_bus_rpc_event)
+
+        self.bus_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.bus_socket.connect(self.bus_path)
+        self.bus_socket.sendall(encode_frame(BUS_SUBSCRIBE, b''))
+        self.bus_socket.setblocking(False)
+        # Wiadomości TCP są numerowane po kolejności publikacji, więc kolejka nie może ich wyrzucać.
+        self.bus_outbound = OutboundQueue(self.bus_socket, BUS_QUEUE_BYTES, BACKPRESSURE)
+        self.selector.register(self.bus_socket, selectors.EVENT_READ, self._handle_bus_event)
+
+    def _handle_bus_event(self, mask):
+        if mask & selectors.EVENT_WRITE:
+            self._write_bus(self.bus_outbound, self._handle_bus_event)
+        if not mask & selectors.EVENT_READ or not self.running:
+            return
+        try:
+            if not self.bus_decoder.recv_from(self.bus_socket):
+                raise ConnectionError("Magistrala zakończyła połączenie.")
+            for message_type, payload in self.bus_decoder.frames():
+                if message_type == BUS_TCP:
+                    seq, = BUS_SEQ.unpack_from(payload)
+                    self._deliver_tcp(seq, bytes(payload[BUS_SEQ.size:]))
+                elif message_type == BUS_TCP_ACK:
+                    self._handle_ack(*BUS_ACK.unpack(payload))
+                elif message_type == BUS_UDP:
+                    ip, port = UDP_SOURCE.unpack_from(payload)
+                    source = (socket.inet_ntoa(ip), port)
+                    super()._broadcast_udp([(payload[UDP_SOURCE.size:], source)], 1)
+        except BlockingIOError:
+            return
+        except (OSError, ProtocolError):
+            self.log.event('bus_lost', shard=self.shard_id)
+            self.stop()
+
+    def _publish(self, message_type, message):
+        self.bus_outbound.push(encode_bus_frame(message_type, message))
+
+    def _broadcast_tcp(self, message, sender):
+        # Lokalni klienci też dostają wiadomość dopiero z numerem od magistrali, żeby historie shardów były zgodne.
+        self.log.event('tcp_broadcast', address=sender.address, size=len(message))
+        self._published += 1
+        message = bytes(message)
+        self._unacked.append((self._published, message, sender))
+        self._publish(BUS_TCP, BUS_SEQ.pack(self._published) + message)
+
+    def _handle_ack(self, number, seq):
+        while self._unacked and self._unacked[0][0] < number:
+            # Potwierdzenie zginęło w przepełnionej kolejce magistrali.
+            self._unacked.popleft()
+            self.log.count('bus_ack_lost')
+        if not self._unacked or self._unacked[0][0] != number:
+            return
+        _, message, sender = self._unacked.popleft()
+        self._deliver_tcp(seq, message, sender if sender in self.clients else None)
+        self._confirm_seq(sender, seq)
+
+    def _deliver_tcp(self, seq, message, sender=None):
+        if seq > self.history.next_seq:
+            self.log.count('history_gap', seq - self.history.next_seq)
+            self.history.skip_to(seq)
+        self._fan_out_tcp(message, sender)
+
+    def _broadcast_udp(self, batch, count):
+        super()._broadcast_udp(batch, count)
+        for index in range(count):
+            message, (ip, port) = batch[index]
+            self._publish(BUS_UDP, UDP_SOURCE.pack(socket.inet_aton(ip), port) + message)
+
+    def _flush_outbound(self):
+        super()._flush_outbound()
+        if self.bus_outbound:
+            self._write_bus(self.bus_outbound, self._handle_bus_event)
+        if self.bus_rpc_outbound:
+            self._write_bus(self.bus_rpc_outbound, self._handle_bus_rpc_event)
+
+    def _write_bus(self, outbound, handler):
+        try:
+            outbound.flush()
+        except OSError:
+            self.stop()
+            return
+        events = selectors.EVENT_READ
+        if outbound:
+            events |= selectors.EVENT_WRITE
+        self.selector.modify(outbound.sock, events, handler)
+
+    def _handle_bus_rpc_event(self, mask):
+        if mask & selectors.EVENT_WRITE:
+            self._write_bus(self.bus_rpc_outbound, self._handle_bus_rpc_event)
+        if not mask & selectors.EVENT_READ or not self.running:
+            return
+        try:
+            if not self.bus_rpc_decoder.recv_from(self.bus_rpc):
+                raise ConnectionError("Magistrala zakończyła połączenie.")
+            for reply_type, _ in self.bus_rpc_decoder.frames():
+                if self._claims:
+                    client, since = self._claims.popleft()
+                    self._finish_claim(client, since, reply_type == BUS_CLAIM_OK)
+        except BlockingIOError:
+            return
+        except (OSError, ProtocolError):
+            self.log.event('bus_lost', shard=self.shard_id)
+            self.stop()
+
+    def _bus_release(self, nickname):
+        self.bus_rpc_outbound.push(encode_frame(BUS_RELEASE, nickname))
+
+    def _register_client(self, client, since=None):
+        if not client.nickname or self.clients.is_taken(client.nickname):
+            self._reject_nickname(client)
+            return None
+        # Rezerwacja w magistrali nie blokuje pętli: do czasu odpowiedzi odczyt z klienta jest wstrzymany,
+        # a ramki przysłane zaraz po JOIN czekają w jego dekoderze.
+        self.selector.unregister(client.sock)
+        self._claims.append((client, since))
+        self.bus_rpc_outbound.push(encode_frame(BUS_CLAIM, client.nickname))
+        return None
+
+    def _finish_claim(self, client, since, claimed):
+        # Rejestracja i odrzucenie zakładają gniazdo obecne w selektorze; właściwą obsługę ustawi _complete_registration.
+        self.selector.register(client.sock, selectors.EVENT_READ)
+        if not claimed or not self.clients.add(client):
+            if claimed:
+                self._bus_release(client.nickname)
+            self._reject_nickname(client)
+            return
+        self._complete_registration(client, since)
+        try:
+            self._process_frames(client)
+        except (OSError, ProtocolError):
+            self._disconnect_client(client)
+
+    def _disconnect_client(self, client):
+        registered = client in self.clients
+        super()._disconnect_client(client)
+        if registered:
+            self._bus_release(client.nickname)
+
+    def close_connections(self):
+        super().close_connections()
+        while self._claims:
+            client, _ = self._claims.popleft()
+            client.sock.close()
+        for sock in (self.bus_socket, self.bus_rpc):
+            if sock is not None:
+                sock.close()
+
+
+def run_shard(bus_path, shard_id, port, metrics_port=None):
+    # Każdy shard ma własny port metryk: metrics_port + numer shardu.
+    if metrics_port is not None:
+        metrics_port += shard_id
+    server = ClusterServer(bus_path, shard_id, metrics_port=metrics_port)
+    server.server_port = port
+    server.start_server()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serwer czatu z lab_01 uruchomiony na wielu procesach.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--port', type=int, default=5660)
+    parser.add_argument('--bus-path', help="ścieżka gniazda uniksowego magistrali")
+    parser.add_argument('--metrics-port', type=int, help="pierwszy port HTTP z metrykami (kolejne shardy +1)")
+    args = parser.parse_args()
+
+    if not hasattr(socket, 'SO_REUSEPORT') or not hasattr(socket, 'AF_UNIX'):
+        print("Tryb klastra wymaga SO_REUSEPORT i gniazd uniksowych (Linux/BSD).")
+        return
+
+    bus_path = args.bus_path or os.path.join(tempfile.gettempdir(), f"chat-cluster-{args.port}.sock")
+    bus = ClusterBus(bus_path)
+    bus.bind()
+
+    workers = [multiprocessing.Process(target=run_shard, args=(bus_path, i, args.port, args.metrics_port), daemon=True)
+               for i in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    print(f"Klaster: {args.workers} shardów na porcie {args.port}, magistrala {bus_path}")
+
+    try:
+        bus.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Najpierw sygnał do wszystkich shardów, żeby opróżniały klientów równolegle, dopiero potem czekanie.
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+
+
+if __name__ == '__main__':
+    main()
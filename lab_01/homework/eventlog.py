@@ -0,0 +1,110 @@
+import collections
+import datetime
+import json
+import sys
+import threading
+import time
+
+# Domyślnie: co tysięczny datagram UDP i najwyżej 100 zdarzeń TCP na sekundę na typ.
+DEFAULT_SAMPLE = {'udp_message': 1000}
+DEFAULT_RATE_LIMITS = {'tcp_message': 100, 'tcp_broadcast': 100}
+
+
+class EventLog:
+    # Wątek I/O serwera tylko dopisuje krotki do deque (append/popleft są atomowe w CPythonie),
+    # a formatowanie do JSON i zapis odbywają się w osobnym wątku.
+    def __init__(self, stream=None, queue_size=100000, sample=None, rate_limits=None,
+                 flush_interval=0.05, counters_interval=10.0):
+        self.stream = stream if stream is not None else sys.stdout
+        self.queue_size = queue_size
+        self.sample = DEFAULT_SAMPLE if sample is None else sample
+        self.rate_limits = DEFAULT_RATE_LIMITS if rate_limits is None else rate_limits
+        self.flush_interval = flush_interval
+        self.counters_interval = counters_interval
+
+        self.queue = collections.deque()
+        self.counters = collections.Counter()
+        self._seen = collections.Counter()
+        self._window = {}
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='eventlog', daemon=True)
+            self._thread.start()
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    def event(self, name, **fields):
+        if self.sampled(name):
+            self.record(name, **fields)
+
+    def sampled(self, name):
+        # Pozwala pominąć przygotowanie pól zdarzenia, które i tak nie zostanie zapisane.
+        self.counters[f'events.{name}'] += 1
+        if self._should_log(name):
+            return True
+        self.counters['log.suppressed'] += 1
+        return False
+
+    def record(self, name, **fields):
+        if len(self.queue) >= self.queue_size:
+            self.counters['log.dropped'] += 1
+            return
+        self.queue.append((time.time(), name, fields))
+
+    def snapshot(self):
+        return dict(self.counters)
+
+    def close(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._write_pending()
+
+    def _should_log(self, name):
+        every = self.sample.get(name, 1)
+        if every != 1:
+            seen = self._seen[name]
+            self._seen[name] = seen + 1
+            if not every or seen % every:
+                return False
+
+        limit = self.rate_limits.get(name)
+        if limit is None:
+            return True
+        second = int(time.monotonic())
+        window_second, logged = self._window.get(name, (second, 0))
+        if window_second != second:
+            logged = 0
+        if logged >= limit:
+            return False
+        self._window[name] = (second, logged + 1)
+        return True
+
+    def _run(self):
+        next_counters = time.monotonic() + self.counters_interval
+        while not self._stopped.wait(self.flush_interval):
+            if self.counters_interval and time.monotonic() >= next_counters:
+                next_counters += self.counters_interval
+                self.queue.append((time.time(), 'counters', self.snapshot()))
+            self._write_pending()
+
+    def _write_pending(self):
+        lines = []
+        queue = self.queue
+        while queue:
+            timestamp, name, fields = queue.popleft()
+            record = {'ts': datetime.datetime.fromtimestamp(timestamp).isoformat(), 'event': name}
+            record.update(fields)
+            lines.append(json.dumps(record, ensure_ascii=False, default=str))
+        if not lines:
+            return
+        try:
+            self.stream.write('\n'.join(lines) + '\n')
+            self.stream.flush()
+        except (OSError, ValueError):
+            self.counters['log.dropped'] += len(lines)
@@ -0,0 +1,143 @@
+import array
+import bisect
+import os
+
+from protocol import CONTROL, HEADER, SEQ
+
+SEQ_PREFIX = f"{SEQ} ".encode('ascii')
+
+
+class MessageHistory:
+    # Ramki przechowywane są w postaci zakodowanej, więc powtórka to sklejenie gotowych bajtów.
+    def __init__(self, max_messages=1000, max_bytes=4 * 1024 * 1024, path=None, max_replay_bytes=16 * 1024 * 1024):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.max_replay_bytes = max_replay_bytes
+        self.frames = [None] * max_messages
+        self.first_seq = 1
+        self.next_seq = 1
+        self.size_bytes = 0
+
+        self.file = None
+        self.offsets = array.array('Q')
+        self.file_end = 0
+        if path is not None:
+            self._open_file(path)
+
+    @property
+    def last_seq(self):
+        return self.next_seq - 1
+
+    def __len__(self):
+        return self.next_seq - self.first_seq
+
+    def append(self, frame):
+        while len(self) and (len(self) >= self.max_messages or self.size_bytes + len(frame) > self.max_bytes):
+            self._evict()
+
+        seq = self.next_seq
+        self.frames[seq % self.max_messages] = frame
+        self.size_bytes += len(frame)
+        self.next_seq += 1
+
+        if self.file is not None:
+            self.offsets.append(self.file_end)
+            self.file.write(frame)
+            self.file_end += len(frame)
+        return seq
+
+    def skip_to(self, seq):
+        # Numery poniżej seq nie zostaną zapisane (np. shard klastra nie dostał części wiadomości).
+        while len(self):
+            self._evict()
+        if self.file is not None:
+            self.offsets.extend([self.file_end] * (seq - self.next_seq))
+        self.first_seq = self.next_seq = seq
+
+    def since(self, seq):
+        start = max(seq + 1, 1)
+        parts = []
+        if start < self.first_seq and self.file is not None:
+            parts.append(self._read_file(start, self.first_seq))
+        for seq in range(max(start, self.first_seq), self.next_seq):
+            parts.append(self.frames[seq % self.max_messages])
+
+        size = sum(map(len, parts))
+        first = 0
+        while size > self.max_replay_bytes and first < len(parts) - 1:
+            size -= len(parts[first])
+            first += 1
+        return b''.join(parts[first:])
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _evict(self):
+        index = self.first_seq % self.max_messages
+        self.size_bytes -= len(self.frames[index])
+        self.frames[index] = None
+        self.first_seq += 1
+
+    def _read_file(self, start, end):
+        # Ograniczenie wielkości powtórki z pliku: pomijamy najstarsze ramki.
+        end_offset = self.offsets[end - 1] if end - 1 < len(self.offsets) else self.file_end
+        min_offset = end_offset - self.max_replay_bytes
+        if self.offsets[start - 1] < min_offset:
+            start = bisect.bisect_left(self.offsets, min_offset) + 1
+        start_offset = self.offsets[start - 1]
+
+        self.file.flush()
+        self.file.seek(start_offset)
+        data = self.file.read(end_offset - start_offset)
+        self.file.seek(0, os.SEEK_END)
+        return data
+
+    def _open_file(self, path):
+        self.file = open(path, 'a+b')
+        file_size = self.file.seek(0, os.SEEK_END)
+        self.file.seek(0)
+        # Wpis to ramka "SEQ <n>" i wiadomość, którą numeruje; offsets[n - 1] wskazuje początek wpisu n.
+        offset = 0
+        entry_start = None
+        while offset + HEADER.size <= file_size:
+            _, message_type, length = HEADER.unpack(self.file.read(HEADER.size))
+            if offset + HEADER.size + length > file_size:
+                break
+            payload = self.file.read(length) if message_type == CONTROL else b''
+            if payload.startswith(SEQ_PREFIX):
+                seq = payload[len(SEQ_PREFIX):]
+                if entry_start is not None or not seq.isdigit() or int(seq) <= len(self.offsets):
+                    break
+                entry_start = offset
+                # Numery pominięte przez skip_to() nie zajmują miejsca w pliku.
+                self.offsets.extend([offset] * (int(seq) - 1 - len(self.offsets)))
+            else:
+                self.offsets.append(offset if entry_start is None else entry_start)
+                entry_start = None
+            offset += HEADER.size + length
+            self.file.seek(offset)
+        if entry_start is not None:
+            offset = entry_start
+
+        # Niepełny albo niespójny koniec pliku (np. po awarii serwera) jest obcinany.
+        self.file.truncate(offset)
+        self.file_end = offset
+
+        count = len(self.offsets)
+        self.first_seq = self.next_seq = count + 1
+        first_cached = count
+        while first_cached > 0 and count - first_cached < self.max_messages:
+            if offset - self.offsets[first_cached - 1] > self.max_bytes:
+                break
+            first_cached -= 1
+
+        if first_cached < count:
+            self.file.seek(self.offsets[first_cached])
+            for seq in range(first_cached + 1, count + 1):
+                end = self.offsets[seq] if seq < count else offset
+                self.frames[seq % self.max_messages] = self.file.read(end - self.offsets[seq - 1])
+            self.first_seq = first_cached + 1
+            self.size_bytes = offset - self.offsets[first_cached]
+        self.file.seek(0, os.SEEK_END)
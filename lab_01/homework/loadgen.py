@@ -0,0 +1,214 @@
+import argparse
+import array
+import asyncio
+import datetime
+import json
+import sys
+import time
+
+from async_client import AsyncClient, NickTakenError
+from protocol import CHAT
+
+LOAD_MARKER = 'LG'
+TRANSPORTS = ('tcp', 'udp', 'multicast')
+
+
+class LoadStats:
+    def __init__(self):
+        self.connect_times = array.array('d')
+        self.connect_failures = 0
+        self.sent = dict.fromkeys(TRANSPORTS, 0)
+        self.delivered = dict.fromkeys(TRANSPORTS, 0)
+        self.latencies = {transport: array.array('q') for transport in TRANSPORTS}
+
+    def record_delivery(self, transport, text, received_ns):
+        # Wiadomość generatora: "<nick>: LG <czas wysłania w ns>"
+        _, _, body = text.partition(': ')
+        marker, _, sent_ns = body.partition(' ')
+        if marker != LOAD_MARKER:
+            return
+        self.delivered[transport] += 1
+        self.latencies[transport].append(received_ns - int(sent_ns))
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def summarize(values, scale):
+    values = sorted(values)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values) / scale,
+        'p50': percentile(values, 0.50) / scale,
+        'p99': percentile(values, 0.99) / scale,
+        'p999': percentile(values, 0.999) / scale,
+        'max': values[-1] / scale,
+    }
+
+
+class Session:
+    def __init__(self, index, args, stats):
+        self.index = index
+        self.nickname = f"lg{index}"
+        self.args = args
+        self.stats = stats
+        self.client = AsyncClient(self.nickname, args.host, args.port, multicast=index < args.multicast_receivers,
+                                  reconnect=False)
+
+    async def connect(self):
+        started = time.perf_counter()
+        await self.client.connect()
+        self.stats.connect_times.append(time.perf_counter() - started)
+
+    async def receive(self):
+        async for message in self.client.messages():
+            # Powtórka historii zawiera wiadomości z wcześniejszych przebiegów; liczą się tylko nowe.
+            if message.message_type == CHAT and not message.replayed:
+                self.stats.record_delivery(message.transport, message.text, message.received_ns)
+
+    async def send(self, transports, rate, deadline):
+        interval = 1 / rate
+        index = 0
+        # Rozłożenie startu sesji, żeby nie wysyłały wszystkie w tej samej chwili.
+        await asyncio.sleep(interval * (self.index % 1000) / 1000)
+        while time.perf_counter() < deadline:
+            transport = transports[index % len(transports)]
+            index += 1
+            await self.client.send(f"{LOAD_MARKER} {time.monotonic_ns()}", transport)
+            self.stats.sent[transport] += 1
+            await asyncio.sleep(interval)
+
+    async def close(self):
+        await self.client.close()
+
+
+async def run(args):
+    stats = LoadStats()
+    transports = tuple(args.transports.split(','))
+    for transport in transports:
+        if transport not in TRANSPORTS:
+            raise ValueError(f"Nieznany transport: {transport}")
+
+    sessions = [Session(i, args, stats) for i in range(args.sessions)]
+    semaphore = asyncio.Semaphore(args.connect_concurrency)
+
+    async def connect(session):
+        async with semaphore:
+            try:
+                await session.connect()
+                return session
+            except (OSError, NickTakenError) as e:
+                stats.connect_failures += 1
+                print(f"Nie udało się połączyć {session.nickname}: {e}", file=sys.stderr)
+                return None
+
+    connect_started = time.perf_counter()
+    sessions = [session for session in await asyncio.gather(*(connect(s) for s in sessions)) if session]
+    connect_duration = time.perf_counter() - connect_started
+    print(f"Połączono {len(sessions)} sesji w {connect_duration:.2f} s")
+
+    receivers = [asyncio.create_task(session.receive()) for session in sessions]
+    send_started = time.perf_counter()
+    deadline = send_started + args.duration
+    await asyncio.gather(*(session.send(transports, args.rate, deadline) for session in sessions))
+    send_duration = time.perf_counter() - send_started
+    await asyncio.sleep(args.drain)
+
+    await asyncio.gather(*(session.close() for session in sessions))
+    await asyncio.gather(*receivers)
+
+    return build_report(args, stats, len(sessions), connect_duration, send_duration)
+
+
+def build_report(args, stats, connected, connect_duration, send_duration):
+    window = send_duration + args.drain
+    transports = {}
+    for transport in TRANSPORTS:
+        if not stats.sent[transport]:
+            continue
+        transports[transport] = {
+            'sent': stats.sent[transport],
+            'delivered': stats.delivered[transport],
+            'sent_per_second': stats.sent[transport] / send_duration,
+            'delivered_per_second': stats.delivered[transport] / window,
+            'latency_ms': summarize(stats.latencies[transport], 1e6),
+        }
+    return {
+        'timestamp': datetime.datetime.now().isoformat(),
+        'label': args.label,
+        'config': {
+            'host': args.host,
+            'port': args.port,
+            'sessions': args.sessions,
+            'rate_per_session': args.rate,
+            'duration': args.duration,
+            'transports': args.transports,
+            'multicast_receivers': args.multicast_receivers,
+        },
+        'connections': {
+            'connected': connected,
+            'failed': stats.connect_failures,
+            'total_seconds': connect_duration,
+            'setup_ms': summarize([int(t * 1e9) for t in stats.connect_times], 1e6),
+        },
+        'transports': transports,
+    }
+
+
+def raise_fd_limit():
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def print_report(report):
+    connections = report['connections']
+    setup = connections['setup_ms']
+    print(f"Sesje: {connections['connected']} (błędy: {connections['failed']}), "
+          f"zestawienie połączenia p50/p99: {setup.get('p50', 0):.2f}/{setup.get('p99', 0):.2f} ms")
+    for transport, result in report['transports'].items():
+        latency = result['latency_ms']
+        line = (f"[{transport.upper()}] wysłano {result['sent']} ({result['sent_per_second']:,.0f}/s), "
+                f"dostarczono {result['delivered']} ({result['delivered_per_second']:,.0f}/s)")
+        if latency['count']:
+            line += f", opóźnienie p50/p99/p999: {latency['p50']:.2f}/{latency['p99']:.2f}/{latency['p999']:.2f} ms"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generator obciążenia dla serwera czatu z lab_01.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5660)
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=1.0, help="wiadomości/s na sesję")
+    parser.add_argument('--duration', type=float, default=10.0, help="czas wysyłania w sekundach")
+    parser.add_argument('--drain', type=float, default=2.0, help="czas oczekiwania na spóźnione wiadomości")
+    parser.add_argument('--transports', default='tcp', help="lista transportów oddzielona przecinkami: tcp,udp,multicast")
+    parser.add_argument('--multicast-receivers', type=int, default=0, help="liczba sesji dołączających do grupy multicast")
+    parser.add_argument('--connect-concurrency', type=int, default=100)
+    parser.add_argument('--label', default='', help="etykieta przebiegu zapisywana w wynikach")
+    parser.add_argument('--output', help="plik, do którego zostaną dopisane wyniki (JSON lines)")
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(report) + '\n')
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
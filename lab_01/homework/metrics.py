@@ -0,0 +1,153 @@
+import bisect
+import time
+
+# Czas rozesłania jednej wiadomości TCP do wszystkich klientów (sekundy).
+FANOUT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5)
+RATE_WINDOW = 1.0
+
+# Liczniki z EventLog eksportowane jako metryki: nazwa licznika -> (nazwa metryki, transport).
+TRANSPORT_COUNTERS = {
+    'tcp_messages_in': ('chat_messages_received_total', 'tcp'),
+    'tcp_bytes_in': ('chat_bytes_received_total', 'tcp'),
+    'tcp_frames_out': ('chat_messages_sent_total', 'tcp'),
+    'tcp_bytes_out': ('chat_bytes_sent_total', 'tcp'),
+    'udp_received': ('chat_messages_received_total', 'udp'),
+    'udp_bytes_in': ('chat_bytes_received_total', 'udp'),
+    'udp_relayed': ('chat_messages_sent_total', 'udp'),
+    'udp_bytes_out': ('chat_bytes_sent_total', 'udp'),
+    'udp_dropped': ('chat_messages_dropped_total', 'udp'),
+}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, fraction):
+        # Górna granica kubełka, w którym wypada dany kwantyl.
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float('inf')
+
+    def render(self, name, labels=''):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}le="+Inf"}} {self.count}')
+        suffix = f'{{{labels.rstrip(",")}}}' if labels else ''
+        lines.append(f'{name}_sum{suffix} {self.sum}')
+        lines.append(f'{name}_count{suffix} {self.count}')
+        return lines
+
+
+class ServerMetrics:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.fanout_seconds = Histogram(FANOUT_BUCKETS)
+        self.fanout_recipients = 0
+        self.loop_busy = 0.0
+        self.loop_idle = 0.0
+        self.loop_iterations = 0
+
+        self._rate_at = self.started
+        self._rate_counters = {}
+        self.rates = {}
+        self._busy_at = 0.0
+        self._idle_at = 0.0
+        self.utilization = 0.0
+
+    def observe_fanout(self, seconds, recipients):
+        self.fanout_seconds.observe(seconds)
+        self.fanout_recipients += recipients
+
+    def observe_loop(self, idle, busy):
+        self.loop_idle += idle
+        self.loop_busy += busy
+        self.loop_iterations += 1
+
+    def update_rates(self, counters, now=None):
+        # Tempo liczone z przyrostów liczników od poprzedniego okna (co najmniej RATE_WINDOW sekund).
+        now = time.monotonic() if now is None else now
+        elapsed = now - self._rate_at
+        if elapsed < RATE_WINDOW:
+            return
+        self.rates = {name: (counters.get(name, 0) - self._rate_counters.get(name, 0)) / elapsed
+                      for name in TRANSPORT_COUNTERS}
+        busy = self.loop_busy - self._busy_at
+        idle = self.loop_idle - self._idle_at
+        self.utilization = busy / (busy + idle) if busy + idle else 0.0
+        self._rate_at = now
+        self._rate_counters = {name: counters.get(name, 0) for name in TRANSPORT_COUNTERS}
+        self._busy_at, self._idle_at = self.loop_busy, self.loop_idle
+
+    def render(self, clients, counters):
+        depths = [(client.outbound.pending_bytes, len(client.outbound)) for client in clients
+                  if client.outbound is not None]
+        lines = [
+            '# TYPE chat_connected_clients gauge',
+            f'chat_connected_clients {len(depths)}',
+            '# TYPE chat_uptime_seconds gauge',
+            f'chat_uptime_seconds {time.monotonic() - self.started}',
+        ]
+
+        metrics = {}
+        for counter, (metric, transport) in TRANSPORT_COUNTERS.items():
+            metrics.setdefault(metric, []).append(f'{metric}{{transport="{transport}"}} {counters.get(counter, 0)}')
+        for metric, samples in metrics.items():
+            lines.append(f'# TYPE {metric} counter')
+            lines.extend(samples)
+
+        lines += [
+            '# TYPE chat_outbound_bytes gauge',
+            f'chat_outbound_bytes {sum(pending for pending, _ in depths)}',
+            '# TYPE chat_outbound_bytes_max gauge',
+            f'chat_outbound_bytes_max {max((pending for pending, _ in depths), default=0)}',
+            '# TYPE chat_outbound_messages gauge',
+            f'chat_outbound_messages {sum(queued for _, queued in depths)}',
+            '# TYPE chat_slow_consumer_total counter',
+            f'chat_slow_consumer_total {counters.get("tcp_slow_consumer", 0)}',
+            '# TYPE chat_broadcast_seconds histogram',
+        ]
+        lines += self.fanout_seconds.render('chat_broadcast_seconds')
+        lines += [
+            '# TYPE chat_broadcast_recipients_total counter',
+            f'chat_broadcast_recipients_total {self.fanout_recipients}',
+            '# TYPE chat_event_loop_busy_seconds_total counter',
+            f'chat_event_loop_busy_seconds_total {self.loop_busy}',
+            '# TYPE chat_event_loop_idle_seconds_total counter',
+            f'chat_event_loop_idle_seconds_total {self.loop_idle}',
+            '# TYPE chat_event_loop_utilization gauge',
+            f'chat_event_loop_utilization {self.utilization}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def summary(self, clients):
+        depths = [client.outbound.pending_bytes for client in clients if client.outbound is not None]
+        rates = self.rates
+        return (f"Klienci: {len(depths)}, czas działania: {time.monotonic() - self.started:.0f} s\n"
+                f"TCP: {rates.get('tcp_messages_in', 0):,.0f} wiad./s in, "
+                f"{rates.get('tcp_frames_out', 0):,.0f} wiad./s out, "
+                f"{rates.get('tcp_bytes_out', 0) / 1024:,.1f} KiB/s out\n"
+                f"UDP: {rates.get('udp_received', 0):,.0f} dgr./s in, "
+                f"{rates.get('udp_relayed', 0):,.0f} dgr./s out, "
+                f"{rates.get('udp_dropped', 0):,.0f} dgr./s odrzuconych\n"
+                f"Kolejki wychodzące: {sum(depths)} B łącznie, {max(depths, default=0)} B max\n"
+                f"Rozgłaszanie p50/p99: {self.fanout_seconds.quantile(0.5) * 1e3:.2f}/"
+                f"{self.fanout_seconds.quantile(0.99) * 1e3:.2f} ms, "
+                f"wykorzystanie pętli: {100 * self.utilization:.1f}%")
@@ -0,0 +1,73 @@
+import collections
+import itertools
+import os
+import socket
+
+DROP_OLDEST = 'drop_oldest'
+DISCONNECT = 'disconnect'
+BACKPRESSURE = 'backpressure'
+SLOW_CONSUMER_POLICIES = (DROP_OLDEST, DISCONNECT, BACKPRESSURE)
+
+try:
+    IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 1024
+
+HAS_SENDMSG = hasattr(socket.socket, 'sendmsg')
+
+
+class OutboundQueue:
+    def __init__(self, sock, max_bytes=1024 * 1024, policy=DROP_OLDEST):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Nieznana polityka wolnego odbiorcy: {policy}")
+        self.sock = sock
+        self.max_bytes = max_bytes
+        self.low_watermark = max_bytes // 2
+        self.policy = policy
+        self.messages = collections.deque()
+        self.offset = 0
+        self.pending_bytes = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.messages)
+
+    def push(self, message):
+        # Zwraca False, gdy kolejka przekroczyła limit i polityka nie pozwala wyrzucić starych wiadomości.
+        self.messages.append(message)
+        self.pending_bytes += len(message)
+        if self.pending_bytes <= self.max_bytes:
+            return True
+        if self.policy != DROP_OLDEST:
+            return False
+
+        # Częściowo wysłanej wiadomości z czoła kolejki nie można wyrzucić bez zepsucia strumienia ramek.
+        index = 1 if self.offset else 0
+        while self.pending_bytes > self.max_bytes and len(self.messages) > index + 1:
+            self.pending_bytes -= len(self.messages[index])
+            del self.messages[index]
+            self.dropped += 1
+        return True
+
+    def flush(self):
+        # Zwraca True, gdy kolejka została opróżniona; False, gdy gniazdo nie przyjmie więcej danych.
+        while self.messages:
+            buffers = list(itertools.islice(self.messages, IOV_MAX))
+            if self.offset:
+                buffers[0] = memoryview(buffers[0])[self.offset:]
+            try:
+                if HAS_SENDMSG:
+                    sent = self.sock.sendmsg(buffers)
+                else:
+                    sent = self.sock.send(b''.join(buffers))
+            except (BlockingIOError, InterruptedError):
+                return False
+            self._advance(sent)
+        return True
+
+    def _advance(self, sent):
+        self.pending_bytes -= sent
+        sent += self.offset
+        while self.messages and sent >= len(self.messages[0]):
+            sent -= len(self.messages.popleft())
+        self.offset = sent
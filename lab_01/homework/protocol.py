@@ -0,0 +1,136 @@
+import struct
+
+PROTOCOL_VERSION = 1
+
+# version (1B) | message type (1B) | payload length (4B, big endian) | UTF-8 payload
+HEADER = struct.Struct('!BBI')
+MAX_PAYLOAD = 1 << 20
+
+CHAT = 1
+JOIN = 2
+LEAVE = 3
+CONTROL = 4
+MESSAGE_TYPES = (CHAT, JOIN, LEAVE, CONTROL)
+
+NICK = 'NICK'
+NICK_TAKEN = 'NICK_TAKEN'
+SERVER_SHUTDOWN = 'SERVER_SHUTDOWN'
+HISTORY = 'HISTORY'
+HISTORY_END = 'HISTORY_END'
+# "SEQ <n>" poprzedza każdą ramkę zapisaną w historii (także w powtórce); nadawca dostaje go jako potwierdzenie.
+SEQ = 'SEQ'
+STATS = 'STATS'
+RATE_LIMITED = 'RATE_LIMITED'
+# Podpowiedzi w SERVER_SHUTDOWN: "SERVER_SHUTDOWN redirect host:port" albo "SERVER_SHUTDOWN reconnect <ms>".
+REDIRECT = 'redirect'
+RECONNECT = 'reconnect'
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_frame(message_type, payload, max_payload=MAX_PAYLOAD):
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    if len(payload) > max_payload:
+        raise ProtocolError(f"Wiadomość za długa: {len(payload)} B (max {max_payload} B)")
+    return HEADER.pack(PROTOCOL_VERSION, message_type, len(payload)) + payload
+
+
+def decode_text(payload):
+    return str(payload, 'utf-8', 'replace')
+
+
+def encode_join(nickname, since=None):
+    # Klient wracający po zerwaniu połączenia może poprosić o historię od podanego numeru sekwencyjnego.
+    if since is None:
+        return encode_frame(JOIN, nickname)
+    return encode_frame(JOIN, f"{nickname}\0{since}")
+
+
+def parse_join(payload):
+    nickname, _, since = decode_text(payload).partition('\0')
+    return nickname, int(since) if since.isdigit() else None
+
+
+def parse_shutdown(text):
+    # Zwraca (adres przekierowania albo None, opóźnienie ponownego połączenia w sekundach albo None).
+    _, _, hint = text.partition(' ')
+    kind, _, value = hint.partition(' ')
+    if kind == REDIRECT:
+        host, _, port = value.rpartition(':')
+        if host and port.isdigit():
+            return (host, int(port)), 0.0
+    elif kind == RECONNECT and value.isdigit():
+        return None, int(value) / 1000
+    return None, None
+
+
+class FrameDecoder:
+    # Payloady zwracane przez frames() to widoki (memoryview) na wewnętrzny bufor,
+    # ważne tylko do następnego wywołania recv_from()/feed(). Atrybut frame wskazuje całą
+    # ostatnio zwróconą ramkę (z nagłówkiem), żeby można ją było przekazać dalej bez ponownego kodowania.
+    def __init__(self, capacity=64 * 1024, message_types=MESSAGE_TYPES, max_payload=MAX_PAYLOAD):
+        self.message_types = message_types
+        self.max_payload = max_payload
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+        self.frame = None
+
+    def recv_from(self, sock):
+        self._make_room(1)
+        received = sock.recv_into(self.view[self.end:])
+        self.end += received
+        return received
+
+    def feed(self, data):
+        self._make_room(len(data))
+        self.view[self.end:self.end + len(data)] = data
+        self.end += len(data)
+
+    def frames(self):
+        while self.end - self.start >= HEADER.size:
+            version, message_type, length = HEADER.unpack_from(self.buffer, self.start)
+            if version != PROTOCOL_VERSION:
+                raise ProtocolError(f"Nieobsługiwana wersja protokołu: {version}")
+            if message_type not in self.message_types:
+                raise ProtocolError(f"Nieznany typ wiadomości: {message_type}")
+            if length > self.max_payload:
+                raise ProtocolError(f"Wiadomość za długa: {length} B")
+
+            frame_end = self.start + HEADER.size + length
+            if frame_end > self.end:
+                self._reserve(HEADER.size + length)
+                return
+
+            self.frame = self.view[self.start:frame_end]
+            payload = self.frame[HEADER.size:]
+            self.start = frame_end
+            yield message_type, payload
+
+    def _make_room(self, size):
+        if self.start == self.end:
+            self.start = self.end = 0
+        if len(self.buffer) - self.end >= size:
+            return
+        pending = self.end - self.start
+        if pending + size > len(self.buffer):
+            self._grow(pending + size)
+        else:
+            self.view[:pending] = self.view[self.start:self.end]
+            self.start, self.end = 0, pending
+
+    def _reserve(self, frame_size):
+        if frame_size > len(self.buffer):
+            self._grow(frame_size)
+
+    def _grow(self, size):
+        pending = self.end - self.start
+        buffer = bytearray(max(size, 2 * len(self.buffer)))
+        buffer[:pending] = self.view[self.start:self.end]
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        self.start, self.end = 0, pending
@@ -0,0 +1,67 @@
+DROP = 'drop'
+DEFER = 'defer'
+FLOOD_POLICIES = (DROP, DEFER)
+
+# Wyniki RateLimiter.check(); BLOCKED zwracane jest tylko w chwili nałożenia blokady,
+# kolejne wiadomości zablokowanego klienta dostają DROPPED.
+ALLOWED = 0
+DEFERRED = 1
+DROPPED = 2
+BLOCKED = 3
+
+
+class TokenBucket:
+    __slots__ = ('tokens', 'updated', 'strikes', 'last_strike', 'blocked_until')
+
+    def __init__(self, tokens, now):
+        self.tokens = tokens
+        self.updated = now
+        self.strikes = 0
+        self.last_strike = now
+        self.blocked_until = 0.0
+
+
+class RateLimiter:
+    # Wspólna konfiguracja dla wszystkich klientów; stan każdego klienta trzyma jego TokenBucket.
+    # Tokeny uzupełniane są leniwie przy sprawdzeniu, więc koszt check() jest stały.
+    def __init__(self, rate, burst=None, policy=DROP, block_after=20, strike_window=10.0, block_seconds=30.0):
+        if policy not in FLOOD_POLICIES:
+            raise ValueError(f"Nieznana polityka limitu wiadomości: {policy}")
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, 2 * rate)
+        self.policy = policy
+        self.block_after = block_after
+        self.strike_window = strike_window
+        self.block_seconds = block_seconds
+
+    def bucket(self, now):
+        return TokenBucket(self.burst, now)
+
+    def check(self, bucket, now):
+        if bucket.blocked_until > now:
+            return DROPPED
+
+        tokens = bucket.tokens + (now - bucket.updated) * self.rate
+        bucket.tokens = tokens if tokens < self.burst else self.burst
+        bucket.updated = now
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return ALLOWED
+
+        if self.policy == DEFER:
+            # Wiadomość przechodzi "na kredyt", a nadawca czeka, aż dług zostanie spłacony (zob. delay()).
+            bucket.tokens -= 1
+            return DEFERRED
+
+        if now - bucket.last_strike > self.strike_window:
+            bucket.strikes = 0
+        bucket.strikes += 1
+        bucket.last_strike = now
+        if bucket.strikes >= self.block_after:
+            bucket.strikes = 0
+            bucket.blocked_until = now + self.block_seconds
+            return BLOCKED
+        return DROPPED
+
+    def delay(self, bucket):
+        return max(0.0, -bucket.tokens) / self.rate
@@ -0,0 +1,67 @@
+import threading
+
+
+class ClientRecord:
+    __slots__ = ('sock', 'nickname', 'address', 'udp_address', 'decoder', 'outbound', 'handler',
+                 'paused_by', 'blocked_senders', 'tcp_bucket', 'udp_bucket')
+
+    def __init__(self, sock, nickname, address, decoder=None, outbound=None):
+        self.sock = sock
+        self.nickname = nickname
+        self.address = address
+        self.udp_address = address
+        self.decoder = decoder
+        self.outbound = outbound
+        self.handler = None
+        self.paused_by = set()
+        self.blocked_senders = set()
+        self.tcp_bucket = None
+        self.udp_bucket = None
+
+    def __repr__(self):
+        return f"ClientRecord({self.nickname!r}, {self.address!r})"
+
+
+class ClientRegistry:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._by_nickname = {}
+        self._by_udp_address = {}
+
+    def __len__(self):
+        return len(self._by_nickname)
+
+    def __contains__(self, record):
+        return self._by_nickname.get(record.nickname) is record
+
+    def __iter__(self):
+        with self._lock:
+            return iter(tuple(self._by_nickname.values()))
+
+    def add(self, record):
+        with self._lock:
+            if record.nickname in self._by_nickname:
+                return False
+            self._by_nickname[record.nickname] = record
+            self._by_udp_address[record.udp_address] = record
+            return True
+
+    def remove(self, record):
+        with self._lock:
+            if self._by_nickname.get(record.nickname) is not record:
+                return False
+            del self._by_nickname[record.nickname]
+            if self._by_udp_address.get(record.udp_address) is record:
+                del self._by_udp_address[record.udp_address]
+            return True
+
+    def is_taken(self, nickname):
+        return nickname in self._by_nickname
+
+    def by_udp_address(self, udp_address):
+        return self._by_udp_address.get(udp_address)
+
+    def clear(self):
+        with self._lock:
+            self._by_nickname.clear()
+            self._by_udp_address.clear()
@@ -1,111 +1,625 @@
-import datetime
+import argparse
+import heapq
+import itertools
+import random
+import selectors
+import signal
 import socket
-import queue
-from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+from eventlog import EventLog
+from history import MessageHistory
+from metrics import ServerMetrics
+from ratelimit import ALLOWED, BLOCKED, DEFERRED, DROP, DROPPED, FLOOD_POLICIES, RateLimiter
+from outbound import DISCONNECT, DROP_OLDEST, OutboundQueue
+from protocol import (CHAT, CONTROL, HISTORY, HISTORY_END, JOIN, LEAVE, NICK, NICK_TAKEN, RATE_LIMITED, RECONNECT, SEQ,
+                      REDIRECT, SERVER_SHUTDOWN, STATS,
+                      FrameDecoder, ProtocolError, decode_text, encode_frame, parse_join)
+from registry import ClientRecord, ClientRegistry
+
+UDP_DATAGRAM_SIZE = 8192
+UDP_SOCKET_BUFFER = 4 * 1024 * 1024
+# Znacznik w ClientRecord.paused_by: odczyt wstrzymany przez limit wiadomości (polityka defer).
+RATE_LIMIT_PAUSE = 'rate_limit'
+
 
 class Server:
-    def __init__(self):
+    def __init__(self, slow_consumer_policy=DROP_OLDEST, max_outbound_bytes=1024 * 1024,
+                 udp_batch_size=64, reuse_port=False, history_size=1000, history_replay=50, history_path=None,
+                 log=None, metrics_port=None, drain_timeout=5.0, reconnect_spread=2.0, redirect=None,
+                 tcp_rate=None, tcp_burst=None, udp_rate=None, udp_burst=None, flood_policy=DROP,
+                 block_after=20, block_seconds=30.0):
         self.server_port = 5660
         self.server_ip = '127.0.0.1'
-        self.clients = []
+        self.clients = ClientRegistry()
         self.tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
         self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-        self.client_queue = queue.Queue()
-        self.executor = ThreadPoolExecutor(max_workers=5)
+        self.selector = selectors.DefaultSelector()
+        self.running = False
+        self.reuse_port = reuse_port
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+
+        self.slow_consumer_policy = slow_consumer_policy
+        self.max_outbound_bytes = max_outbound_bytes
+        self._pending_flush = set()
+
+        self.udp_buffers = [memoryview(bytearray(UDP_DATAGRAM_SIZE)) for _ in range(udp_batch_size)]
+        self.udp_batch = [None] * udp_batch_size
+        self.log = log if log is not None else EventLog()
+        self.metrics = ServerMetrics()
+        self.metrics_port = metrics_port
+        self.metrics_socket = None
+
+        self.drain_timeout = drain_timeout
+        self.reconnect_spread = reconnect_spread
+        self.redirect = redirect
+
+        # Limity wiadomości na klienta; None wyłącza limit dla danego transportu.
+        self.tcp_limiter = (RateLimiter(tcp_rate, tcp_burst, flood_policy, block_after, block_seconds=block_seconds)
+                            if tcp_rate else None)
+        # Datagramów nie da się odłożyć na później, więc UDP zawsze je odrzuca.
+        self.udp_limiter = (RateLimiter(udp_rate, udp_burst, DROP, block_after, block_seconds=block_seconds)
+                            if udp_rate else None)
+        self._timers = []
+        self._timer_ids = itertools.count()
+
+        # Powtórka musi zmieścić się w kolejce wychodzącej nowego klienta.
+        self.history = MessageHistory(history_size, path=history_path, max_replay_bytes=max_outbound_bytes // 2)
+        self.history_replay = history_replay
 
     def start_server(self):
+        self.log.start()
         try:
-            print(f'Server listening on port {self.server_port}')
+            self.log.event('listening', port=self.server_port)
             self.tcp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if self.reuse_port:
+                self.tcp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+                self.udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
             self.tcp_socket.bind((self.server_ip, self.server_port))
-            self.tcp_socket.listen(3)
+            self.tcp_socket.listen(socket.SOMAXCONN)
+            self.udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_SOCKET_BUFFER)
+            self.udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, UDP_SOCKET_BUFFER)
             self.udp_socket.bind((self.server_ip, self.server_port))
+            if self.metrics_port is not None:
+                self.metrics_socket = socket.create_server((self.server_ip, self.metrics_port))
+                self.metrics_socket.setblocking(False)
+                self.selector.register(self.metrics_socket, selectors.EVENT_READ,
+                                       lambda mask: self._connect_metrics_client())
+                self.log.event('metrics_listening', port=self.metrics_port)
+
+        except OSError as e:
+            self.log.event('bind_failed', port=self.server_port, error=str(e))
+            self.log.close()
+            return
+
+        self.tcp_socket.setblocking(False)
+        self.udp_socket.setblocking(False)
+        self._wakeup_reader.setblocking(False)
+
+        self.selector.register(self.tcp_socket, selectors.EVENT_READ, lambda mask: self._connect_with_tcp_client())
+        self.selector.register(self.udp_socket, selectors.EVENT_READ, lambda mask: self._handle_udp_message())
+        self.selector.register(self._wakeup_reader, selectors.EVENT_READ, lambda mask: self._drain_wakeup())
 
-            self.executor.submit(self._connect_with_tcp_client)
-            self.executor.submit(self._handle_udp_message)
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
 
-            for _ in range(3):
-                self.executor.submit(self._worker_thread)
+        self.running = True
+        try:
+            self._event_loop()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close_connections()
 
+    def stop(self, redirect=None):
+        # Bezpieczne do wywołania z innego wątku i z obsługi sygnału; właściwe zamykanie robi close_connections().
+        if redirect is not None:
+            self.redirect = redirect
+        self.running = False
+        try:
+            self._wakeup_writer.send(b'\0')
         except OSError:
-            print("Adres już w użyciu! Zakończ poprzednie połączenia.")
+            pass
+
+    def _event_loop(self):
+        perf_counter = time.perf_counter
+        while self.running:
+            idle_started = perf_counter()
+            # Ramki dodane podczas poprzedniego opróżniania kolejek (np. LEAVE po błędzie zapisu) nie mogą czekać na zdarzenie.
+            events = self.selector.select(0 if self._pending_flush else self._timer_timeout())
+            busy_started = perf_counter()
+            for key, mask in events:
+                key.data(mask)
+            self._run_timers()
+            self._flush_outbound()
+            self.metrics.observe_loop(busy_started - idle_started, perf_counter() - busy_started)
+            self.metrics.update_rates(self.log.counters)
+
+    def _call_later(self, delay, callback):
+        heapq.heappush(self._timers, (time.monotonic() + delay, next(self._timer_ids), callback))
+
+    def _timer_timeout(self):
+        if not self._timers:
+            return None
+        return max(0.0, self._timers[0][0] - time.monotonic())
+
+    def _run_timers(self):
+        now = time.monotonic()
+        while self._timers and self._timers[0][0] <= now:
+            _, _, callback = heapq.heappop(self._timers)
+            callback()
+
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup_reader.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _send_tcp(self, client, message, sender=None):
+        self._pending_flush.add(client)
+        if client.outbound.push(message):
+            return True
+        self.log.count('tcp_slow_consumer')
+        if self.slow_consumer_policy == DISCONNECT:
+            self.log.event('slow_consumer_disconnect', nickname=client.nickname, address=client.address)
+            return False
+        if sender is not None and sender in self.clients:
+            self._pause_sender(sender, client)
+        return True
+
+    def _flush_outbound(self):
+        pending, self._pending_flush = self._pending_flush, set()
+        for client in pending:
+            if client in self.clients:
+                self._write_outbound(client)
+
+    def _write_outbound(self, client):
+        try:
+            client.outbound.flush()
+        except OSError:
+            self._disconnect_client(client)
             return
+        if client.outbound.pending_bytes <= client.outbound.low_watermark:
+            self._resume_senders(client)
+        self._update_events(client)
 
-    def _broadcast_tcp(self, message, address):
-        print(f"[TCP][{address}][{datetime.datetime.now()}] Wysyłanie wiadomości do wszystkich")
-        for client in self.clients:
-            if client[2] != address:
-                client[0].send(message)
+    def _pause_sender(self, sender, lagging):
+        sender.paused_by.add(lagging)
+        lagging.blocked_senders.add(sender)
+        self._update_events(sender)
+
+    def _resume_senders(self, lagging):
+        senders, lagging.blocked_senders = lagging.blocked_senders, set()
+        for sender in senders:
+            sender.paused_by.discard(lagging)
+            if not sender.paused_by and sender in self.clients:
+                self._update_events(sender)
+
+    def _update_events(self, client):
+        sock = client.sock
+        events = 0
+        if not client.paused_by:
+            events |= selectors.EVENT_READ
+        if client.outbound:
+            events |= selectors.EVENT_WRITE
+
+        try:
+            key = self.selector.get_key(sock)
+        except KeyError:
+            key = None
 
-    def _broadcast_udp(self, message, address):
-        print(f"[UDP][{address}][{datetime.datetime.now()}] Wysyłanie wiadomości do wszystkich")
+        if events == 0:
+            if key is not None:
+                self.selector.unregister(sock)
+        elif key is None:
+            self.selector.register(sock, events, client.handler)
+        elif key.events != events:
+            self.selector.modify(sock, events, key.data)
+
+    def _broadcast_tcp(self, message, sender):
+        self.log.event('tcp_broadcast', address=sender.address, size=len(message))
+        self._confirm_seq(sender, self._fan_out_tcp(message, sender))
+
+    def _confirm_seq(self, sender, seq):
+        # Nadawca nie dostaje własnej wiadomości, więc numer w historii potwierdzamy mu osobno.
+        if sender in self.clients:
+            self._send_tcp(sender, encode_frame(CONTROL, f"{SEQ} {seq}"))
+
+    def _fan_out_tcp(self, message, sender=None):
+        # Jedna kopia (znacznik SEQ + ramka) jest współdzielona przez kolejki wszystkich odbiorców i historię.
+        seq = self.history.next_seq
+        message = b''.join((encode_frame(CONTROL, f"{SEQ} {seq}"), message))
+        self.history.append(message)
+        started = time.perf_counter()
+        recipients = 0
+        lagging = []
         for client in self.clients:
-            if client[2] != address:
-                self.udp_socket.sendto(message, client[2])
+            if client is sender:
+                continue
+            recipients += 1
+            if not self._send_tcp(client, message, sender):
+                lagging.append(client)
+        self.metrics.observe_fanout(time.perf_counter() - started, recipients)
+        self.log.count('tcp_frames_out', recipients)
+        self.log.count('tcp_bytes_out', recipients * len(message))
+        for client in lagging:
+            self._disconnect_client(client)
+        return seq
+
+    def _broadcast_udp(self, batch, count):
+        recipients = [client.udp_address for client in self.clients]
+        sendto = self.udp_socket.sendto
+        relayed = dropped = relayed_bytes = 0
+        for index in range(count):
+            message, address = batch[index]
+            for recipient in recipients:
+                if recipient == address:
+                    continue
+                try:
+                    relayed_bytes += sendto(message, recipient)
+                    relayed += 1
+                except OSError:
+                    dropped += 1
+        self.log.count('udp_relayed', relayed)
+        self.log.count('udp_bytes_out', relayed_bytes)
+        self.log.count('udp_dropped', dropped)
+
+    def _handle_client_event(self, client, mask):
+        if mask & selectors.EVENT_WRITE:
+            self._write_outbound(client)
+        if mask & selectors.EVENT_READ and client in self.clients:
+            self._handle_tcp_message(client)
 
     def _handle_tcp_message(self, client):
-        while True:
-            try:
-                message = client[0].recv(1024)
-                if not message:
-                    raise Exception("Klient zakończył połączenie.")
+        try:
+            if not client.decoder.recv_from(client.sock):
+                raise ConnectionError("Klient zakończył połączenie.")
+            self._process_frames(client)
 
-                print(f"[TCP][{client[2]}][{datetime.datetime.now()}] Otrzymano wiadomość od {client[1]}")
-                self._broadcast_tcp(message, client[2])
+        except BlockingIOError:
+            return
+        except (OSError, ProtocolError):
+            self._disconnect_client(client)
 
-            except Exception:
-                self._disconnect_client(client)
+    def _process_frames(self, client):
+        for message_type, payload in client.decoder.frames():
+            self._handle_frame(client, message_type, payload)
+            # Pozostałe ramki czekają w buforze dekodera do wznowienia odczytu.
+            if RATE_LIMIT_PAUSE in client.paused_by:
                 return
 
+    def _check_tcp_limit(self, client):
+        # Zwraca True, gdy wiadomość może zostać rozesłana.
+        if self.tcp_limiter is None:
+            return True
+        now = time.monotonic()
+        result = self.tcp_limiter.check(client.tcp_bucket, now)
+        if result == ALLOWED:
+            return True
+        if result == DEFERRED:
+            self.log.count('tcp_rate_deferred')
+            self._defer_client(client, self.tcp_limiter.delay(client.tcp_bucket))
+            return True
+        self.log.count('tcp_rate_dropped')
+        if result == BLOCKED:
+            self._block_client(client, 'tcp')
+        return False
+
+    def _defer_client(self, client, delay):
+        client.paused_by.add(RATE_LIMIT_PAUSE)
+        self._update_events(client)
+        self._call_later(delay, lambda: self._resume_deferred(client))
+
+    def _resume_deferred(self, client):
+        client.paused_by.discard(RATE_LIMIT_PAUSE)
+        if client not in self.clients:
+            return
+        self._update_events(client)
+        try:
+            self._process_frames(client)
+        except (OSError, ProtocolError):
+            self._disconnect_client(client)
+
+    def _block_client(self, client, transport):
+        seconds = self.tcp_limiter.block_seconds if transport == 'tcp' else self.udp_limiter.block_seconds
+        self.log.event('client_blocked', nickname=client.nickname, address=client.address, transport=transport,
+                       seconds=seconds)
+        self._send_tcp(client, encode_frame(CONTROL, f"{RATE_LIMITED} {transport} {seconds:g}"))
+
+    def _filter_udp_batch(self, count):
+        # Odrzuca datagramy ponad limit nadawcy, zagęszczając partię w miejscu; zwraca nową liczbę datagramów.
+        now = time.monotonic()
+        batch = self.udp_batch
+        kept = 0
+        for index in range(count):
+            message, address = batch[index]
+            sender = self.clients.by_udp_address(address)
+            if sender is None:
+                result = DROPPED
+            else:
+                result = self.udp_limiter.check(sender.udp_bucket, now)
+            if result == ALLOWED:
+                batch[kept] = batch[index]
+                kept += 1
+                continue
+            self.log.count('udp_rate_dropped')
+            if result == BLOCKED:
+                self._block_client(sender, 'udp')
+        return kept
+
+    def _handle_frame(self, client, message_type, payload):
+        # Polecenia (HISTORY, STATS) zużywają ten sam limit co wiadomości: powtórka historii jest wielokrotnie
+        # większa niż żądanie, więc bez limitu byłaby najtańszym sposobem zalania serwera.
+        if message_type not in (CHAT, CONTROL) or not self._check_tcp_limit(client):
+            return
+        if message_type == CONTROL:
+            command, _, argument = decode_text(payload).partition(' ')
+            if command == HISTORY and argument.isdigit():
+                self._send_history(client, int(argument))
+            elif command == STATS:
+                self.metrics.update_rates(self.log.counters)
+                self._send_tcp(client, encode_frame(CONTROL, f"{STATS}\n{self.metrics.summary(self.clients)}"))
+            return
+        self.log.count('tcp_messages_in')
+        self.log.count('tcp_bytes_in', len(payload))
+        self.log.event('tcp_message', address=client.address, nickname=client.nickname, size=len(payload))
+        # Widok na odebraną ramkę (z nagłówkiem); kopiowana jest raz, razem ze znacznikiem SEQ, w _fan_out_tcp.
+        self._broadcast_tcp(client.decoder.frame, client)
+
     def _handle_udp_message(self):
-        while True:
-            message, address = self.udp_socket.recvfrom(1024)
-            nickname = next((client[1] for client in self.clients if client[2] == address), None)
-            print(f"[UDP][{address}][{datetime.datetime.now()}] Otrzymano wiadomość od {nickname}")
-            self._broadcast_udp(message, address)
+        count = received_bytes = 0
+        for buffer in self.udp_buffers:
+            try:
+                nbytes, address = self.udp_socket.recvfrom_into(buffer)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionResetError:
+                continue
+            self.udp_batch[count] = (buffer[:nbytes], address)
+            count += 1
+            received_bytes += nbytes
+        if not count:
+            return
+
+        self.log.count('udp_received', count)
+        self.log.count('udp_bytes_in', received_bytes)
+        if self.udp_limiter is not None:
+            count = self._filter_udp_batch(count)
+            if not count:
+                return
+        self._broadcast_udp(self.udp_batch, count)
+
+        if self.log.sampled('udp_message'):
+            address = self.udp_batch[count - 1][1]
+            sender = self.clients.by_udp_address(address)
+            self.log.record('udp_message', address=address, nickname=sender.nickname if sender is not None else None,
+                            batch=count)
 
     def _disconnect_client(self, client):
-        client[0].close()
-        self.clients.remove(client)
-        nickname = client[1]
-        print(f"[{datetime.datetime.now()}] {nickname} opuścił czat")
-        self._broadcast_tcp(f"{nickname} opuścił czat.".encode('utf-8'), client[2])
+        if not self.clients.remove(client):
+            return
+        self._resume_senders(client)
+        client.paused_by.clear()
+        self._pending_flush.discard(client)
+        try:
+            self.selector.unregister(client.sock)
+        except KeyError:
+            pass
+        client.sock.close()
+        nickname = client.nickname
+        self.log.event('leave', nickname=nickname, address=client.address)
+        self._broadcast_tcp(encode_frame(LEAVE, f"{nickname} opuścił czat."), client)
 
     def _connect_with_tcp_client(self):
         while True:
-            client, address = self.tcp_socket.accept()
-            print(f"[{datetime.datetime.now()}] {address} połączony!")
+            try:
+                client, address = self.tcp_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                self.log.event('accept_failed', error=str(e))
+                return
 
-            nickname = client.recv(1024).decode('utf-8')
+            self.log.event('connect', address=address)
+            client.setblocking(False)
+            decoder = FrameDecoder()
+            self.selector.register(client, selectors.EVENT_READ,
+                                   lambda mask, client=client, address=address, decoder=decoder:
+                                   self._receive_nickname(client, address, decoder))
 
-            if any(nick == nickname for _, nick, _ in self.clients):
-                client.send("NICK_TAKEN".encode('utf-8'))
-                print(f"[{datetime.datetime.now()}] Nick {nickname} jest już zajęty!")
-                client.close() 
-                continue
+    def _connect_metrics_client(self):
+        while True:
+            try:
+                sock, _ = self.metrics_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                self.log.event('accept_failed', error=str(e))
+                return
+            sock.setblocking(False)
+            self.selector.register(sock, selectors.EVENT_READ, lambda mask, sock=sock: self._serve_metrics(sock))
+
+    def _serve_metrics(self, sock):
+        # Minimalny serwer HTTP/1.0: jedno żądanie GET /metrics na połączenie.
+        try:
+            request = sock.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            request = b''
+        self.selector.unregister(sock)
 
-            print(f"Ustawiono nick: {nickname}")
-            client.send('NICK'.encode('utf-8'))
+        if request.startswith((b'GET /metrics ', b'GET / ')):
+            self.metrics.update_rates(self.log.counters)
+            body = self.metrics.render(self.clients, self.log.counters).encode('utf-8')
+            status = b'200 OK'
+        else:
+            body = b'Not Found\n'
+            status = b'404 Not Found'
+        header = (b'HTTP/1.0 ' + status + b'\r\nContent-Type: text/plain; version=0.0.4\r\n'
+                  b'Content-Length: ' + str(len(body)).encode('ascii') + b'\r\nConnection: close\r\n\r\n')
+        try:
+            sock.sendall(header + body)
+        except OSError:
+            pass
+        sock.close()
 
-            self.clients.append((client, nickname, address))
-            self._broadcast_tcp(f"{nickname} dołączył do czatu.".encode('utf-8'), address)
-            client.send("Połączono z serwerem!".encode('utf-8'))
+    def _receive_nickname(self, client, address, decoder):
+        entry = None
+        try:
+            if not decoder.recv_from(client):
+                raise ConnectionError("Klient zakończył połączenie.")
 
-            self.client_queue.put((client, nickname, address))
+            for message_type, payload in decoder.frames():
+                if entry is not None:
+                    self._handle_frame(entry, message_type, payload)
+                    if RATE_LIMIT_PAUSE in entry.paused_by:
+                        return
+                    continue
+                if message_type != JOIN:
+                    raise ProtocolError("Oczekiwano wiadomości JOIN.")
+                nickname, since = parse_join(payload)
+                entry = self._register_client(ClientRecord(client, nickname, address, decoder), since)
+                if entry is None:
+                    return
 
-    def _worker_thread(self):
-        while True:
-            client = self.client_queue.get()
-            if client:
-                self._handle_tcp_message(client)
-                self.client_queue.task_done()
+        except BlockingIOError:
+            return
+        except (OSError, ProtocolError):
+            if entry is not None:
+                self._disconnect_client(entry)
+            else:
+                self.selector.unregister(client)
+                client.close()
+
+    def _register_client(self, client, since=None):
+        if not client.nickname or not self._claim_nickname(client):
+            self._reject_nickname(client)
+            return None
+        return self._complete_registration(client, since)
+
+    def _reject_nickname(self, client):
+        try:
+            client.sock.send(encode_frame(CONTROL, NICK_TAKEN))
+        except OSError:
+            pass
+        self.log.event('nick_taken', nickname=client.nickname, address=client.address)
+        self.selector.unregister(client.sock)
+        client.sock.close()
+
+    def _complete_registration(self, client, since):
+        self.log.event('join', nickname=client.nickname, address=client.address)
+        client.outbound = OutboundQueue(client.sock, self.max_outbound_bytes, self.slow_consumer_policy)
+        now = time.monotonic()
+        if self.tcp_limiter is not None:
+            client.tcp_bucket = self.tcp_limiter.bucket(now)
+        if self.udp_limiter is not None:
+            client.udp_bucket = self.udp_limiter.bucket(now)
+        client.handler = lambda mask: self._handle_client_event(client, mask)
+        self.selector.modify(client.sock, selectors.EVENT_READ, client.handler)
+        self._send_tcp(client, encode_frame(CONTROL, NICK))
+        self._send_tcp(client, encode_frame(CHAT, "Połączono z serwerem!"))
+        if since is None:
+            since = max(0, self.history.last_seq - self.history_replay)
+        self._send_history(client, since, end_marker=False)
+
+        self._broadcast_tcp(encode_frame(JOIN, f"{client.nickname} dołączył do czatu."), client)
+        self._send_tcp(client, encode_frame(CONTROL, f"{HISTORY_END} {self.history.last_seq}"))
+        return client
+
+    def _send_history(self, client, since, end_marker=True):
+        # Powtórka jest ujęta w "HISTORY <since>" ... "HISTORY_END <seq>", żeby klient odróżnił ją od nowych wiadomości.
+        self._send_tcp(client, encode_frame(CONTROL, f"{HISTORY} {since}"))
+        frames = self.history.since(since)
+        if frames:
+            self._send_tcp(client, frames)
+        if end_marker:
+            self._send_tcp(client, encode_frame(CONTROL, f"{HISTORY_END} {self.history.last_seq}"))
+
+    def _claim_nickname(self, client):
+        return self.clients.add(client)
 
     def close_connections(self):
+        self.running = False
+        # Najpierw przestajemy przyjmować nowe połączenia i datagramy, potem opróżniamy kolejki klientów.
+        self.tcp_socket.close()
+        self.udp_socket.close()
+        if self.metrics_socket is not None:
+            self.metrics_socket.close()
+        self._drain_clients()
+        self.clients.clear()
+        self.history.close()
+        self.selector.close()
+        self._wakeup_reader.close()
+        self._wakeup_writer.close()
+        self.log.record('shutdown', counters=self.log.snapshot())
+        self.log.close()
+
+    def _shutdown_frame(self):
+        if self.redirect is not None:
+            return encode_frame(CONTROL, f"{SERVER_SHUTDOWN} {REDIRECT} {self.redirect}")
+        # Rozrzucenie ponownych połączeń w czasie, żeby klienci nie wrócili jednocześnie.
+        delay_ms = random.randint(0, int(self.reconnect_spread * 1000))
+        return encode_frame(CONTROL, f"{SERVER_SHUTDOWN} {RECONNECT} {delay_ms}")
+
+    def _drain_clients(self):
+        # Wszystkie gniazda opróżniane są równolegle w jednej pętli select, ale nie dłużej niż drain_timeout.
+        deadline = time.monotonic() + self.drain_timeout
+        drain_selector = selectors.DefaultSelector()
         for client in self.clients:
-            client[0].send("SERVER_SHUTDOWN".encode('utf-8'))
-            client[0].close()
-        self.executor.shutdown(wait=True)
+            client.outbound.push(self._shutdown_frame())
+            drain_selector.register(client.sock, selectors.EVENT_WRITE, client)
+
+        drained = 0
+        try:
+            while drain_selector.get_map():
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                for key, mask in drain_selector.select(timeout):
+                    if self._drain_client(drain_selector, key.data, mask):
+                        drained += 1
+        finally:
+            abandoned = len(drain_selector.get_map())
+            for key in list(drain_selector.get_map().values()):
+                key.fileobj.close()
+            drain_selector.close()
+        self.log.event('drained', clients=drained, abandoned=abandoned)
+
+    def _drain_client(self, drain_selector, client, mask):
+        # Zwraca True, gdy połączenie zostało zamknięte po wysłaniu wszystkich danych.
+        sock = client.sock
+        try:
+            if mask & selectors.EVENT_WRITE:
+                if not client.outbound.flush():
+                    return False
+                # Po wysłaniu kolejki czekamy na FIN klienta, żeby close() nie wysłało RST i nie zgubiło danych.
+                sock.shutdown(socket.SHUT_WR)
+                drain_selector.modify(sock, selectors.EVENT_READ, client)
+                return False
+            if sock.recv(65536):
+                return False
+        except BlockingIOError:
+            return False
+        except OSError:
+            pass
+        drain_selector.unregister(sock)
+        sock.close()
+        return True
 
 if __name__ == '__main__':
-    server = Server()
+    parser = argparse.ArgumentParser(description="Serwer czatu z lab_01.")
+    parser.add_argument('--metrics-port', type=int, help="port HTTP z metrykami w formacie Prometheusa")
+    parser.add_argument('--drain-timeout', type=float, default=5.0, help="maksymalny czas opróżniania kolejek przy zamykaniu")
+    parser.add_argument('--redirect', help="adres host:port przekazywany klientom przy zamykaniu serwera")
+    parser.add_argument('--tcp-rate', type=float, help="limit wiadomości TCP na klienta na sekundę")
+    parser.add_argument('--udp-rate', type=float, help="limit datagramów UDP na klienta na sekundę")
+    parser.add_argument('--flood-policy', choices=FLOOD_POLICIES, default=DROP,
+                        help="co robić z wiadomościami TCP ponad limit")
+    args = parser.parse_args()
+
+    server = Server(metrics_port=args.metrics_port, drain_timeout=args.drain_timeout, redirect=args.redirect,
+                    tcp_rate=args.tcp_rate, udp_rate=args.udp_rate, flood_policy=args.flood_policy)
     server.start_server()
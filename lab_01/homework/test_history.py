@@ -0,0 +1,67 @@
+from history import MessageHistory
+from protocol import CHAT, CONTROL, SEQ, encode_frame
+
+
+def entry(seq, text):
+    # Tak jak Server._fan_out_tcp: znacznik SEQ i wiadomość zapisane jako jeden wpis.
+    return encode_frame(CONTROL, f"{SEQ} {seq}") + encode_frame(CHAT, text)
+
+
+def fill(history, count):
+    for seq in range(1, count + 1):
+        assert history.append(entry(seq, f"msg{seq}")) == seq
+
+
+def test_reopen_restores_sequence_numbers(tmp_path):
+    path = tmp_path / 'history.bin'
+    history = MessageHistory(path=path)
+    fill(history, 5)
+    history.close()
+
+    reopened = MessageHistory(path=path)
+    assert reopened.last_seq == 5
+    assert reopened.since(3) == entry(4, "msg4") + entry(5, "msg5")
+    assert reopened.append(entry(6, "msg6")) == 6
+    reopened.close()
+
+
+def test_reopen_replays_evicted_entries_from_file(tmp_path):
+    path = tmp_path / 'history.bin'
+    history = MessageHistory(max_messages=2, path=path)
+    fill(history, 5)
+    history.close()
+
+    reopened = MessageHistory(max_messages=2, path=path)
+    assert reopened.first_seq == 4
+    assert reopened.since(1) == b''.join(entry(seq, f"msg{seq}") for seq in range(2, 6))
+    reopened.close()
+
+
+def test_reopen_truncates_incomplete_entry(tmp_path):
+    path = tmp_path / 'history.bin'
+    history = MessageHistory(path=path)
+    fill(history, 3)
+    history.close()
+    # Awaria między zapisem znacznika SEQ a wiadomości.
+    with open(path, 'ab') as f:
+        f.write(encode_frame(CONTROL, f"{SEQ} 4"))
+
+    reopened = MessageHistory(path=path)
+    assert reopened.last_seq == 3
+    assert reopened.append(entry(4, "msg4")) == 4
+    assert reopened.since(2) == entry(3, "msg3") + entry(4, "msg4")
+    reopened.close()
+
+
+def test_reopen_keeps_numbers_after_skip(tmp_path):
+    path = tmp_path / 'history.bin'
+    history = MessageHistory(path=path)
+    fill(history, 2)
+    history.skip_to(5)
+    assert history.append(entry(5, "msg5")) == 5
+    history.close()
+
+    reopened = MessageHistory(path=path)
+    assert reopened.last_seq == 5
+    assert reopened.since(1) == entry(2, "msg2") + entry(5, "msg5")
+    reopened.close()
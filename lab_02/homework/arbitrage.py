@@ -0,0 +1,36 @@
+from typing import List, Optional
+
+import numpy as np
+
+
+def spread_matrix(prices: np.ndarray) -> np.ndarray:
+    """Returns spreads[c, i, j] = (price on j - price on i) / price on i * 100 for a (cryptos, exchanges) price matrix.
+
+    Missing prices are NaN and give NaN spreads.
+    """
+    buy = prices[:, :, np.newaxis]
+    sell = prices[:, np.newaxis, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        spreads = (sell - buy) / buy * 100
+    spreads[~np.isfinite(spreads)] = np.nan
+    return spreads
+
+
+def best_spreads(spreads: np.ndarray, cryptos: List[str], exchanges: List[str]) -> List[Optional[dict]]:
+    """Returns the widest spread per cryptocurrency, or None where fewer than two exchanges quote it."""
+    candidates = np.where(np.isnan(spreads), -np.inf, spreads)
+    # Buying and selling on the same exchange is not an opportunity.
+    diagonal = np.arange(len(exchanges))
+    candidates[:, diagonal, diagonal] = -np.inf
+    flat = candidates.reshape(len(cryptos), -1)
+    best = flat.argmax(axis=1)
+    buy, sell = np.unravel_index(best, (len(exchanges), len(exchanges)))
+    result = []
+    for c, crypto in enumerate(cryptos):
+        difference = flat[c, best[c]]
+        if not np.isfinite(difference):
+            result.append(None)
+            continue
+        result.append({'crypto': crypto, 'buy_on': exchanges[buy[c]], 'sell_on': exchanges[sell[c]],
+                       'difference': float(difference)})
+    return result
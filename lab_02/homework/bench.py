@@ -0,0 +1,170 @@
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+import aiohttp
+
+from server import API_KEY, API_KEY_NAME, SUPPORTED_CRYPTOS, SUPPORTED_EXCHANGES
+
+PERIODS = ["1d", "1w", "1m"]
+
+RequestSpec = Tuple[str, str, dict]
+
+
+def compare_prices(rng: random.Random) -> RequestSpec:
+    exchange1, exchange2 = rng.sample(SUPPORTED_EXCHANGES, 2)
+    return "POST", "/compare_prices/", {"json": {"crypto": rng.choice(SUPPORTED_CRYPTOS),
+                                                  "exchange1": exchange1, "exchange2": exchange2}}
+
+
+def get_chart(rng: random.Random) -> RequestSpec:
+    return "GET", "/get_chart/", {"json": {"crypto": rng.choice(SUPPORTED_CRYPTOS),
+                                           "exchange": rng.choice(SUPPORTED_EXCHANGES), "period": rng.choice(PERIODS)}}
+
+
+def ohlcv(rng: random.Random) -> RequestSpec:
+    return "GET", f"/ohlcv/{rng.choice(SUPPORTED_EXCHANGES)}/{rng.choice(SUPPORTED_CRYPTOS)}/{rng.choice(PERIODS)}", {}
+
+
+def ohlcv_columns(rng: random.Random) -> RequestSpec:
+    method, path, kwargs = ohlcv(rng)
+    return method, path + "?layout=columns", kwargs
+
+
+def chart_data(rng: random.Random) -> RequestSpec:
+    return "GET", f"/chart_data/{rng.choice(SUPPORTED_EXCHANGES)}/{rng.choice(SUPPORTED_CRYPTOS)}/{rng.choice(PERIODS)}", {}
+
+
+def chart_image(rng: random.Random) -> RequestSpec:
+    return "GET", f"/chart_image/{rng.choice(SUPPORTED_EXCHANGES)}/{rng.choice(SUPPORTED_CRYPTOS)}/{rng.choice(PERIODS)}", {}
+
+
+SCENARIOS: Dict[str, Callable[[random.Random], RequestSpec]] = {
+    "compare_prices": compare_prices,
+    "get_chart": get_chart,
+    "chart_image": chart_image,
+    "chart_data": chart_data,
+    "ohlcv": ohlcv,
+    "ohlcv_columns": ohlcv_columns,
+}
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+async def run_scenario(session: aiohttp.ClientSession, base_url: str, make_request: Callable[[random.Random], RequestSpec],
+                       concurrency: int, duration: float, seed: int) -> dict:
+    """Keeps `concurrency` requests in flight for `duration` seconds and collects their latencies."""
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(worker_id: int):
+        nonlocal errors
+        rng = random.Random(seed * 1000 + worker_id)
+        while time.perf_counter() < deadline:
+            method, path, kwargs = make_request(rng)
+            started = time.perf_counter()
+            try:
+                async with session.request(method, base_url + path, **kwargs) as response:
+                    await response.read()
+                    statuses[response.status] = statuses.get(response.status, 0) + 1
+                    if response.status >= 400:
+                        errors += 1
+                        continue
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "statuses": statuses,
+        "rps": len(latencies) / elapsed,
+        "p50": percentile(latencies, 0.50),
+        "p90": percentile(latencies, 0.90),
+        "p99": percentile(latencies, 0.99),
+        "max": latencies[-1] if latencies else float('nan'),
+    }
+
+
+async def wait_until_ready(session: aiohttp.ClientSession, base_url: str, timeout: float):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            async with session.get(base_url + "/docs") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        if time.perf_counter() > deadline:
+            raise TimeoutError(f"Server at {base_url} did not start in {timeout:.0f}s")
+        await asyncio.sleep(0.2)
+
+
+def start_server(port: int, latency: float, error_rate: float) -> subprocess.Popen:
+    """Starts the API on simulated exchanges so the benchmark never touches real ones."""
+    env = dict(os.environ, SIMULATE_EXCHANGES="1", SIM_LATENCY=str(latency), SIM_ERROR_RATE=str(error_rate))
+    return subprocess.Popen([sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+                            cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+
+
+async def main_async(args):
+    headers = {API_KEY_NAME: API_KEY}
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(headers=headers, connector=connector) as session:
+        await wait_until_ready(session, args.url, args.startup_timeout)
+        print(f"{'endpoint':<16}{'requests':>9}{'errors':>8}{'rps':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+        for name in args.endpoints:
+            if args.warmup:
+                await run_scenario(session, args.url, SCENARIOS[name], args.concurrency, args.warmup, args.seed)
+            result = await run_scenario(session, args.url, SCENARIOS[name], args.concurrency, args.duration, args.seed)
+            print(f"{name:<16}{result['requests']:>9}{result['errors']:>8}{result['rps']:>9.1f}"
+                  f"{result['p50'] * 1000:>9.1f}{result['p90'] * 1000:>9.1f}{result['p99'] * 1000:>9.1f}"
+                  f"{result['max'] * 1000:>9.1f}")
+            if result['errors']:
+                print(f"{'':<16}statuses: {result['statuses']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the crypto price API.")
+    parser.add_argument('--url', help="API to test (default: start one on simulated exchanges)")
+    parser.add_argument('--port', type=int, default=8100, help="port of the started API")
+    parser.add_argument('--endpoints', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=32, help="requests kept in flight")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per endpoint")
+    parser.add_argument('--warmup', type=float, default=2.0, help="unmeasured seconds per endpoint before the run")
+    parser.add_argument('--seed', type=int, default=1, help="seed of the request mix, for repeatable runs")
+    parser.add_argument('--sim-latency', type=float, default=0.05, help="simulated exchange latency in seconds")
+    parser.add_argument('--sim-error-rate', type=float, default=0.0, help="fraction of failing exchange calls")
+    parser.add_argument('--startup-timeout', type=float, default=30.0)
+    args = parser.parse_args()
+
+    server_process = None
+    if args.url is None:
+        server_process = start_server(args.port, args.sim_latency, args.sim_error_rate)
+        args.url = f"http://127.0.0.1:{args.port}"
+    try:
+        asyncio.run(main_async(args))
+    finally:
+        if server_process is not None:
+            server_process.terminate()
+            server_process.wait()
+
+
+if __name__ == '__main__':
+    main()
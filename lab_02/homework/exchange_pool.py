@@ -0,0 +1,94 @@
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import aiohttp
+import ccxt.async_support as ccxt_async
+
+from upstream import ExchangeGuard
+
+logger = logging.getLogger(__name__)
+
+
+class ExchangePool:
+    """Process-wide pool of long-lived ccxt async exchange clients sharing one aiohttp session."""
+
+    def __init__(self, exchange_ids: Iterable[str], connection_limit: int = 100, keepalive_timeout: float = 60.0,
+                 max_concurrency: int = 8, burst: float = 5.0, timeout: float = 10.0, hedge_after: Optional[float] = 1.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 exchange_factory: Optional[Callable[[str, aiohttp.ClientSession], Optional[Any]]] = None):
+        self.exchange_ids = list(exchange_ids)
+        self.exchange_factory = exchange_factory or _ccxt_exchange
+        self.connection_limit = connection_limit
+        self.keepalive_timeout = keepalive_timeout
+        self.guard_options = dict(max_concurrency=max_concurrency, burst=burst, timeout=timeout, hedge_after=hedge_after,
+                                  failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.exchanges: Dict[str, ccxt_async.Exchange] = {}
+        self.guards: Dict[str, ExchangeGuard] = {}
+        self._market_locks: Dict[str, asyncio.Lock] = {}
+
+    async def start(self):
+        """Opens the shared HTTP session, creates the clients and preloads their markets."""
+        connector = aiohttp.TCPConnector(limit=self.connection_limit, ttl_dns_cache=300,
+                                         keepalive_timeout=self.keepalive_timeout)
+        self.session = aiohttp.ClientSession(connector=connector)
+        for exchange_id in self.exchange_ids:
+            exchange = self.exchange_factory(exchange_id, self.session)
+            if exchange is None:
+                logger.warning("Exchange %s is not available in this ccxt version", exchange_id)
+                continue
+            self.exchanges[exchange_id] = exchange
+            self.guards[exchange_id] = ExchangeGuard(exchange_id, rate=1000 / exchange.rateLimit, is_failure=_is_outage,
+                                                     **self.guard_options)
+            self._market_locks[exchange_id] = asyncio.Lock()
+
+        # A failed preload is not fatal: get() retries it on first use.
+        await asyncio.gather(*(self._load_markets(exchange_id) for exchange_id in self.exchanges),
+                             return_exceptions=True)
+
+    async def get(self, exchange_id: str) -> ccxt_async.Exchange:
+        """Returns the shared client for an exchange, loading its markets if needed."""
+        exchange = self.exchanges.get(exchange_id)
+        if exchange is None:
+            raise KeyError(exchange_id)
+        if not exchange.markets:
+            await self._load_markets(exchange_id)
+        return exchange
+
+    async def call(self, exchange_id: str, method: str, *args, hedge: bool = False) -> Any:
+        """Calls an exchange method through that exchange's concurrency, rate, timeout and circuit breaker guard."""
+        exchange = await self.get(exchange_id)
+        return await self.guards[exchange_id].call(getattr(exchange, method), *args, hedge=hedge)
+
+    async def _load_markets(self, exchange_id: str):
+        async with self._market_locks[exchange_id]:
+            exchange = self.exchanges[exchange_id]
+            if exchange.markets:
+                return
+            try:
+                await self.guards[exchange_id].call(exchange.load_markets)
+            except Exception as e:
+                logger.warning("Loading markets for %s failed: %s", exchange_id, e)
+                raise
+
+    async def close(self):
+        """Closes all clients and the shared session."""
+        await asyncio.gather(*(exchange.close() for exchange in self.exchanges.values()), return_exceptions=True)
+        self.exchanges.clear()
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+def _ccxt_exchange(exchange_id: str, session: aiohttp.ClientSession) -> Optional[ccxt_async.Exchange]:
+    exchange_class = getattr(ccxt_async, exchange_id, None)
+    if exchange_class is None:
+        return None
+    # ccxt's own throttle is off: the guard enforces the exchange's published rate (rateLimit ms per request).
+    return exchange_class({'session': session, 'enableRateLimit': False})
+
+
+def _is_outage(error: BaseException) -> bool:
+    """Network errors count towards opening the circuit; errors the exchange answered with do not."""
+    return isinstance(error, ccxt_async.NetworkError)
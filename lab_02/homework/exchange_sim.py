@@ -0,0 +1,119 @@
+import asyncio
+import math
+import random
+import time
+import zlib
+from typing import Callable, Dict, Iterable, List, Optional
+
+import ccxt.async_support as ccxt_async
+
+BASE_PRICES = {"BTC": 60000.0, "ETH": 3000.0, "LTC": 80.0, "BNB": 550.0, "XRP": 0.5, "ADA": 0.45, "SOL": 150.0,
+               "DOT": 7.0}
+TIMEFRAME_SECONDS = {'m': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def parse_timeframe(timeframe: str) -> int:
+    """Returns the length of a ccxt timeframe such as '1h' in milliseconds."""
+    return int(timeframe[:-1]) * TIMEFRAME_SECONDS[timeframe[-1]] * 1000
+
+
+class SimulatedExchange:
+    """Offline stand-in for a ccxt async exchange: synthetic prices, configurable latency and injected errors.
+
+    Prices are a deterministic function of (exchange, symbol, time), so candles are stable across calls and
+    exchanges quote slightly different prices for the same symbol.
+    """
+
+    def __init__(self, exchange_id: str, symbols: Iterable[str], latency: float = 0.05, jitter: float = 0.02,
+                 error_rate: float = 0.0, stall_rate: float = 0.0, stall: float = 30.0, rate_limit: int = 50,
+                 seed: Optional[int] = None):
+        self.id = exchange_id
+        self.rateLimit = rate_limit
+        self.has = {'fetchTicker': True, 'fetchTickers': True, 'fetchOHLCV': True}
+        self.markets: Dict[str, dict] = {}
+        self.symbols = list(symbols)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall = stall
+        self.calls = 0
+        self._random = random.Random(seed if seed is not None else zlib.crc32(exchange_id.encode()))
+
+    async def load_markets(self) -> Dict[str, dict]:
+        await self._respond()
+        self.markets = {symbol: {'symbol': symbol, 'base': symbol.split('/')[0], 'quote': symbol.split('/')[1]}
+                        for symbol in self.symbols}
+        return self.markets
+
+    async def fetch_ticker(self, symbol: str) -> dict:
+        await self._respond()
+        return self._ticker(symbol)
+
+    async def fetch_tickers(self, symbols: Optional[List[str]] = None) -> Dict[str, dict]:
+        await self._respond()
+        return {symbol: self._ticker(symbol) for symbol in symbols or self.symbols}
+
+    async def fetch_ohlcv(self, symbol: str, timeframe: str = '1m', since: Optional[int] = None,
+                          limit: Optional[int] = None) -> List[List]:
+        await self._respond()
+        self._check_symbol(symbol)
+        step = parse_timeframe(timeframe)
+        limit = limit or 500
+        now = int(time.time() * 1000)
+        start = (now - step * (limit - 1) if since is None else since) // step * step
+        candles = []
+        for timestamp in range(start, now + 1, step):
+            if len(candles) == limit:
+                break
+            candles.append(self._candle(symbol, timestamp, min(timestamp + step, now)))
+        return candles
+
+    async def close(self):
+        pass
+
+    async def _respond(self):
+        self.calls += 1
+        roll = self._random.random()
+        if roll < self.stall_rate:
+            await asyncio.sleep(self.stall)
+        await asyncio.sleep(max(0.0, self._random.gauss(self.latency, self.jitter)))
+        if roll >= 1 - self.error_rate:
+            raise ccxt_async.NetworkError(f"{self.id} simulated network error")
+
+    def _check_symbol(self, symbol: str):
+        if symbol not in self.symbols:
+            raise ccxt_async.BadSymbol(f"{self.id} does not have market symbol {symbol}")
+
+    def _price(self, symbol: str, timestamp: int) -> float:
+        base = BASE_PRICES.get(symbol.split('/')[0], 100.0)
+        phase = zlib.crc32(symbol.encode()) % 360
+        # Each exchange trades a little above or below the others: up to +/-0.5%.
+        offset = (zlib.crc32(f"{self.id}:{symbol}".encode()) % 1000 - 500) / 100000
+        hours = timestamp / 3_600_000
+        return base * (1 + offset) * (1 + 0.03 * math.sin(hours / 24 * 2 * math.pi + phase)
+                                      + 0.005 * math.sin(hours * 2 * math.pi + phase))
+
+    def _candle(self, symbol: str, timestamp: int, closed_at: int) -> List:
+        noise = random.Random(zlib.crc32(f"{self.id}:{symbol}:{timestamp}".encode()))
+        open_, close = self._price(symbol, timestamp), self._price(symbol, closed_at)
+        high = max(open_, close) * (1 + noise.random() * 0.004)
+        low = min(open_, close) * (1 - noise.random() * 0.004)
+        volume = noise.uniform(10, 1000) * 60000 / BASE_PRICES.get(symbol.split('/')[0], 100.0)
+        return [timestamp, open_, high, low, close, volume]
+
+    def _ticker(self, symbol: str) -> dict:
+        self._check_symbol(symbol)
+        now = int(time.time() * 1000)
+        last = self._price(symbol, now) * (1 + self._random.gauss(0, 0.0002))
+        return {'symbol': symbol, 'timestamp': now, 'last': last, 'bid': last * 0.9999, 'ask': last * 1.0001}
+
+
+def simulator_factory(symbols: Iterable[str], **options) -> Callable[[str, object], SimulatedExchange]:
+    """Returns an ExchangePool exchange factory that builds simulated exchanges with the given options."""
+    symbols = list(symbols)
+
+    def create(exchange_id: str, session) -> SimulatedExchange:
+        return SimulatedExchange(exchange_id, symbols, **options)
+
+    return create
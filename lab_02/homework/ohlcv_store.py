@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SeriesKey = Tuple[str, str, str]
+
+OHLCV_COLUMNS = ("timestamp", "open", "high", "low", "close", "volume")
+
+
+class CandleSeries:
+    """Candles of one (exchange, symbol, timeframe) as sorted columns: int64 timestamps and a float64 (5, n) OHLCV matrix."""
+
+    def __init__(self, timestamps: np.ndarray, values: np.ndarray):
+        self.timestamps = timestamps
+        self.values = values
+        # Earliest time fetched from upstream; the exchange may simply have no candles before the first one.
+        self.covered_from = int(timestamps[0]) if len(timestamps) else None
+        self.refreshed_at = 0.0
+
+    @classmethod
+    def empty(cls) -> "CandleSeries":
+        return cls(np.empty(0, dtype=np.int64), np.empty((5, 0), dtype=np.float64))
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def merge(self, rows: List[List]) -> "CandleSeries":
+        """Returns a series with the given rows added; rows for an existing timestamp replace the stored candle."""
+        if not rows:
+            return self
+        batch = np.asarray(rows, dtype=np.float64)
+        timestamps = np.concatenate([self.timestamps, batch[:, 0].astype(np.int64)])
+        values = np.concatenate([self.values, batch[:, 1:6].T], axis=1)
+        # np.unique keeps the first occurrence, so look from the end to let fresh rows win.
+        _, last = np.unique(timestamps[::-1], return_index=True)
+        keep = len(timestamps) - 1 - last
+        # Fancy indexing along axis 1 yields a strided matrix; copy it back to one contiguous row per field.
+        merged = CandleSeries(timestamps[keep], np.ascontiguousarray(values[:, keep]))
+        merged.covered_from = self.covered_from
+        return merged
+
+    def range(self, since_ms: int, until_ms: Optional[int] = None) -> "CandleSeries":
+        """Returns the candles with since_ms <= timestamp (< until_ms) as views into this series."""
+        start = np.searchsorted(self.timestamps, since_ms, side='left')
+        stop = len(self.timestamps) if until_ms is None else np.searchsorted(self.timestamps, until_ms, side='left')
+        return CandleSeries(self.timestamps[start:stop], self.values[:, start:stop])
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """Returns each OHLCV column as a contiguous array keyed by name."""
+        # ascontiguousarray() turns memmap views into plain C-contiguous ndarrays (no copy when they already are),
+        # which orjson and pickle require.
+        return dict(zip(OHLCV_COLUMNS, map(np.ascontiguousarray, (self.timestamps, *self.values))))
+
+    def rows(self) -> List[List]:
+        """Returns the candles as [timestamp, open, high, low, close, volume] rows."""
+        return [[timestamp, *row] for timestamp, row in zip(self.timestamps.tolist(), self.values.T.tolist())]
+
+
+class OHLCVStore:
+    """Local candle store that fetches only candles newer than the last stored one and answers ranges from memory."""
+
+    def __init__(self, fetch: Callable[[str, str, str, int], Awaitable[List[List]]], directory: Optional[str] = None,
+                 refresh_interval: float = 10.0):
+        self.fetch = fetch
+        self.directory = directory
+        self.refresh_interval = refresh_interval
+        self.hits = 0
+        self.upstream_calls = 0
+        self._series: Dict[SeriesKey, CandleSeries] = {}
+        self._locks: Dict[SeriesKey, asyncio.Lock] = {}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    async def get(self, exchange_id: str, symbol: str, timeframe: str, since_ms: int) -> CandleSeries:
+        """Returns candles since since_ms, fetching upstream only what is missing or may have changed."""
+        key = (exchange_id, symbol, timeframe)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        # One update per series at a time; callers that waited on the lock usually find it fresh.
+        async with lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = self._load(key)
+            if self._is_fresh(series, since_ms):
+                self.hits += 1
+            else:
+                try:
+                    series = await self._update(key, series, timeframe, since_ms)
+                except Exception as e:
+                    # Serve the stored candles while upstream is failing, unless the window was never fetched.
+                    if series.covered_from is None or since_ms < series.covered_from:
+                        raise
+                    logger.warning("Serving stored %s candles, update failed: %s", key, e)
+        return series.range(since_ms)
+
+    def _is_fresh(self, series: CandleSeries, since_ms: int) -> bool:
+        if series.covered_from is None or since_ms < series.covered_from:
+            return False
+        return time.monotonic() - series.refreshed_at < self.refresh_interval
+
+    async def _update(self, key: SeriesKey, series: CandleSeries, timeframe: str, since_ms: int) -> CandleSeries:
+        backfill = series.covered_from is None or since_ms < series.covered_from
+        if backfill or not len(series.timestamps):
+            # Nothing stored that far back: fetch the whole window and merge it with what we have.
+            fetch_since = since_ms
+        else:
+            # The last stored candle may still have been forming, so fetch it again with everything after it.
+            fetch_since = int(series.timestamps[-1])
+        self.upstream_calls += 1
+        rows = await self.fetch(key[0], key[1], timeframe, fetch_since)
+        series = series.merge(rows)
+        if backfill:
+            series.covered_from = since_ms
+        series.refreshed_at = time.monotonic()
+        self._series[key] = series
+        if rows:
+            self._save(key, series)
+        return series
+
+    def _path(self, key: SeriesKey, column: str) -> str:
+        name = "_".join(part.replace("/", "-") for part in key)
+        return os.path.join(self.directory, f"{name}.{column}.npy")
+
+    def _load(self, key: SeriesKey) -> CandleSeries:
+        if not self.directory or not os.path.exists(self._path(key, "values")):
+            return CandleSeries.empty()
+        # Memory-mapped so a large history is paged in on demand rather than read up front.
+        return CandleSeries(np.load(self._path(key, "timestamps"), mmap_mode='r'),
+                            np.load(self._path(key, "values"), mmap_mode='r'))
+
+    def _save(self, key: SeriesKey, series: CandleSeries):
+        if not self.directory:
+            return
+        for column, array in (("timestamps", series.timestamps), ("values", series.values)):
+            path = self._path(key, column)
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, array)
+            os.replace(path + ".tmp", path)
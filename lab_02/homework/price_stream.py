@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import time
+from contextlib import aclosing
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+StreamKey = Tuple[str, str]
+
+
+class PriceHub:
+    """Fans out price updates from one shared upstream poller per (exchange, symbol) to many subscribers."""
+
+    def __init__(self, fetch: Callable[[str, str], Awaitable[dict]], interval: float = 2.0, queue_size: int = 16,
+                 max_backoff: float = 30.0):
+        self.fetch = fetch
+        self.interval = interval
+        self.queue_size = queue_size
+        self.max_backoff = max_backoff
+        self._subscribers: Dict[StreamKey, Set[asyncio.Queue]] = {}
+        self._pollers: Dict[StreamKey, asyncio.Task] = {}
+        self._last: Dict[StreamKey, dict] = {}
+
+    async def subscribe(self, keys: Iterable[StreamKey]) -> AsyncIterator[dict]:
+        """Yields price updates for the given keys until the consumer stops iterating."""
+        keys = list(dict.fromkeys(keys))
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        for key in keys:
+            self._subscribers.setdefault(key, set()).add(queue)
+            if key in self._last:
+                queue.put_nowait(self._last[key])
+            if key not in self._pollers:
+                self._pollers[key] = asyncio.create_task(self._poll(key))
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            for key in keys:
+                subscribers = self._subscribers.get(key)
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[key]
+                    # close() may already have stopped and dropped the poller.
+                    poller = self._pollers.pop(key, None)
+                    if poller is not None:
+                        poller.cancel()
+                    self._last.pop(key, None)
+
+    async def close(self):
+        """Stops all upstream pollers."""
+        pollers = list(self._pollers.values())
+        for poller in pollers:
+            poller.cancel()
+        await asyncio.gather(*pollers, return_exceptions=True)
+        self._pollers.clear()
+
+    async def _poll(self, key: StreamKey):
+        exchange_id, symbol = key
+        delay = self.interval
+        while True:
+            try:
+                ticker = await self.fetch(exchange_id, symbol)
+                delay = self.interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Price stream %s %s failed: %s", exchange_id, symbol, e)
+                delay = min(delay * 2, self.max_backoff)
+            else:
+                update = {'exchange': exchange_id, 'symbol': symbol, 'price': ticker['last'],
+                          'timestamp': ticker.get('timestamp') or int(time.time() * 1000)}
+                previous = self._last.get(key)
+                if previous is None or previous['price'] != update['price']:
+                    self._last[key] = update
+                    self._publish(key, update)
+            await asyncio.sleep(delay)
+
+    def _publish(self, key: StreamKey, update: dict):
+        for queue in self._subscribers.get(key, ()):
+            if queue.full():
+                # Slow subscriber: only the latest prices matter, so drop its oldest update.
+                queue.get_nowait()
+            queue.put_nowait(update)
+
+
+async def spread_updates(hub: PriceHub, crypto: str, exchange1: str, exchange2: str) -> AsyncIterator[dict]:
+    """Yields the live price spread of a cryptocurrency between two exchanges."""
+    symbol = f"{crypto}/USDT"
+    prices: Dict[str, float] = {}
+    async with aclosing(hub.subscribe([(exchange1, symbol), (exchange2, symbol)])) as updates:
+        async for update in updates:
+            prices[update['exchange']] = update['price']
+            if exchange1 not in prices or exchange2 not in prices:
+                continue
+            price1, price2 = prices[exchange1], prices[exchange2]
+            yield {
+                'crypto': crypto,
+                'exchange1': exchange1,
+                'price1': price1,
+                'exchange2': exchange2,
+                'price2': price2,
+                'difference': (price2 - price1) / price1 * 100,
+                'timestamp': update['timestamp'],
+            }
+
+
+async def with_heartbeat(updates: AsyncIterator[dict], interval: float) -> AsyncIterator[dict]:
+    """Passes updates through, yielding None whenever no update arrived for `interval` seconds."""
+    next_update = None
+    async with aclosing(updates):
+        try:
+            while True:
+                if next_update is None:
+                    next_update = asyncio.ensure_future(updates.__anext__())
+                # wait() instead of wait_for(): a timeout must not cancel the pending __anext__().
+                done, _ = await asyncio.wait({next_update}, timeout=interval)
+                if not done:
+                    yield None
+                    continue
+                update, next_update = next_update.result(), None
+                yield update
+        except StopAsyncIteration:
+            return
+        finally:
+            if next_update is not None:
+                next_update.cancel()
+                await asyncio.gather(next_update, return_exceptions=True)
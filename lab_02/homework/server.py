@@ -1,27 +1,85 @@
-from fastapi import FastAPI, Form, Request, HTTPException, Depends
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, Form, Request, HTTPException, Depends, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 import asyncio
-import ccxt
+import os
+import ccxt.async_support as ccxt
+from contextlib import aclosing, asynccontextmanager
 from datetime import datetime, timedelta
-import io
 import base64
-import matplotlib.pyplot as plt
-import mplfinance as mpf
-import matplotlib.dates as mdates
-import pandas as pd
-from pydantic import BaseModel, Field, field_validator
-from typing import List
+import json
+import numpy as np
+import orjson
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from fastapi_utils.cbv import cbv
 from fastapi_utils.inferring_router import InferringRouter
 from fastapi.security import APIKeyHeader
-
-app = FastAPI(title="Crypto Price API", version="1.0")
-templates = Jinja2Templates(directory="templates")
+from exchange_pool import ExchangePool
+from exchange_sim import simulator_factory
+from upstream import CircuitOpenError
+from ticker_cache import TickerCache
+from price_stream import PriceHub, spread_updates, with_heartbeat
+from chart_renderer import IMAGE_MEDIA_TYPES, ChartRenderer
+from arbitrage import best_spreads, spread_matrix
+from ohlcv_store import OHLCV_COLUMNS, CandleSeries, OHLCVStore
 
 SUPPORTED_CRYPTOS = ["BTC", "ETH", "LTC", "BNB", "XRP", "ADA", "SOL", "DOT"]
 SUPPORTED_EXCHANGES = ["binance", "cryptocom", "coinbasepro", "kraken"]
 
+# Tickers are served from memory for TICKER_CACHE_TTL seconds, then stale for up to TICKER_STALE_TTL more while refreshing.
+TICKER_CACHE_TTL = 2.0
+TICKER_STALE_TTL = 10.0
+# While an exchange is failing, prices up to this many seconds older still answer /compare_prices/.
+TICKER_FALLBACK_TTL = 300.0
+# Per exchange: at most UPSTREAM_CONCURRENCY calls in flight, UPSTREAM_TIMEOUT seconds each, a duplicate request
+# after UPSTREAM_HEDGE_AFTER seconds, and no calls for CIRCUIT_RESET_TIMEOUT seconds after CIRCUIT_FAILURES failures.
+UPSTREAM_CONCURRENCY = 8
+UPSTREAM_TIMEOUT = 10.0
+UPSTREAM_HEDGE_AFTER = 1.0
+CIRCUIT_FAILURES = 5
+CIRCUIT_RESET_TIMEOUT = 30.0
+# Streams poll the (cached) ticker this often per (exchange, symbol), however many clients are subscribed.
+STREAM_POLL_INTERVAL = 2.0
+STREAM_HEARTBEAT = 15.0
+# Rendered charts are reusable until a new candle arrives; clients may revalidate them with If-None-Match.
+CHART_CACHE_SIZE = 256
+CHART_MAX_AGE = 60
+# Candles are kept per (exchange, symbol, timeframe) and only the newest ones are refetched, at most this often.
+# Set OHLCV_STORE_DIR to persist them as memory-mapped .npy files across restarts.
+OHLCV_REFRESH_INTERVAL = 10.0
+OHLCV_STORE_DIR = os.environ.get("OHLCV_STORE_DIR")
+CHART_PERIODS = {"1d": (timedelta(days=1), '1h'), "1w": (timedelta(weeks=1), '1d'), "1m": (timedelta(days=30), '1d')}
+
+# SIMULATE_EXCHANGES=1 replaces the real exchanges with exchange_sim (synthetic data, no network), for load tests.
+SIMULATE_EXCHANGES = os.environ.get("SIMULATE_EXCHANGES") == "1"
+SIM_LATENCY = float(os.environ.get("SIM_LATENCY", "0.05"))
+SIM_ERROR_RATE = float(os.environ.get("SIM_ERROR_RATE", "0"))
+SIM_STALL_RATE = float(os.environ.get("SIM_STALL_RATE", "0"))
+
+exchange_factory = None
+if SIMULATE_EXCHANGES:
+    exchange_factory = simulator_factory([f"{crypto}/USDT" for crypto in SUPPORTED_CRYPTOS], latency=SIM_LATENCY,
+                                         jitter=SIM_LATENCY / 2, error_rate=SIM_ERROR_RATE, stall_rate=SIM_STALL_RATE)
+exchange_pool = ExchangePool(SUPPORTED_EXCHANGES, max_concurrency=UPSTREAM_CONCURRENCY, timeout=UPSTREAM_TIMEOUT,
+                             hedge_after=UPSTREAM_HEDGE_AFTER, failure_threshold=CIRCUIT_FAILURES,
+                             reset_timeout=CIRCUIT_RESET_TIMEOUT, exchange_factory=exchange_factory)
+chart_renderer = ChartRenderer(cache_size=CHART_CACHE_SIZE)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Opens the exchange clients on startup and closes them on shutdown."""
+    await asyncio.gather(exchange_pool.start(), chart_renderer.start())
+    yield
+    await price_hub.close()
+    await exchange_pool.close()
+    chart_renderer.close()
+
+
+app = FastAPI(title="Crypto Price API", version="1.0", lifespan=lifespan)
+templates = Jinja2Templates(directory="templates")
+
 # --- Authentication ---
 API_KEY = "kielbasa_krakowska_podsuszana"
 API_KEY_NAME = "Crypto-API-Key"
@@ -64,6 +122,40 @@ class PriceComparisonResponse(BaseModel):
     price2: float
     difference: float = Field(..., description="Percentage difference between prices (price2 - price1) / price1 * 100")
 
+class ArbitrageMatrixRequest(BaseModel):
+    cryptos: List[str] = Field(default_factory=lambda: list(SUPPORTED_CRYPTOS), example=["BTC", "ETH"])
+    exchanges: List[str] = Field(default_factory=lambda: list(SUPPORTED_EXCHANGES), example=["binance", "kraken"])
+
+    @field_validator("cryptos")
+    @classmethod
+    def cryptos_must_be_supported(cls, v):
+        unsupported = [crypto for crypto in v if crypto not in SUPPORTED_CRYPTOS]
+        if unsupported or not v:
+            raise ValueError(f"Unsupported cryptocurrencies: {unsupported}")
+        return list(dict.fromkeys(v))
+
+    @field_validator("exchanges")
+    @classmethod
+    def exchanges_must_be_supported(cls, v):
+        unsupported = [exchange for exchange in v if exchange not in SUPPORTED_EXCHANGES]
+        if unsupported or len(set(v)) < 2:
+            raise ValueError(f"At least two supported exchanges are required, unsupported: {unsupported}")
+        return list(dict.fromkeys(v))
+
+class ArbitrageOpportunity(BaseModel):
+    crypto: str
+    buy_on: str
+    sell_on: str
+    difference: float = Field(..., description="(sell price - buy price) / buy price * 100")
+
+class ArbitrageMatrixResponse(BaseModel):
+    cryptos: List[str]
+    exchanges: List[str]
+    prices: List[List[Optional[float]]] = Field(..., description="prices[crypto][exchange], null when not quoted")
+    spreads: List[List[List[Optional[float]]]] = Field(..., description="spreads[crypto][exchange1][exchange2] in percent")
+    best: List[Optional[ArbitrageOpportunity]]
+    errors: Dict[str, str] = Field(..., description="Exchanges that failed, with the error")
+
 class ErrorResponse(BaseModel):
     detail: str
 
@@ -89,7 +181,7 @@ class ChartRequest(BaseModel):
     @field_validator("period")
     @classmethod
     def period_check(cls, v):
-        if v not in ["1d", "1w", "1m"]:
+        if v not in CHART_PERIODS:
             raise ValueError("Period must be one of: 1d, 1w, 1m")
         return v
 
@@ -99,6 +191,17 @@ class ChartResponse(BaseModel):
     exchange: str
     period: str
 
+class ChartDataResponse(BaseModel):
+    crypto: str
+    exchange: str
+    period: str
+    timestamp: List[int] = Field(..., description="Candle open times in milliseconds")
+    open: List[float]
+    high: List[float]
+    low: List[float]
+    close: List[float]
+    volume: List[float]
+
 class OHLCVData(BaseModel):
     timestamp: int
     open: float
@@ -110,17 +213,39 @@ class OHLCVData(BaseModel):
 class OHLCVResponse(BaseModel):
     data: List[OHLCVData]
 
+class OHLCVColumnsResponse(BaseModel):
+    timestamp: List[int]
+    open: List[float]
+    high: List[float]
+    low: List[float]
+    close: List[float]
+    volume: List[float]
+
 
 # --- Helper Functions ---
+async def fetch_ticker(exchange_id: str, symbol: str) -> dict:
+    """Fetches a ticker from an exchange, bypassing the cache."""
+    return await exchange_pool.call(exchange_id, 'fetch_ticker', symbol, hedge=True)
+
+async def fetch_tickers(exchange_id: str, symbols: List[str]) -> Dict[str, dict]:
+    """Fetches tickers of several symbols in one request, bypassing the cache."""
+    return await exchange_pool.call(exchange_id, 'fetch_tickers', symbols, hedge=True)
+
+ticker_cache = TickerCache(fetch_ticker, ttl=TICKER_CACHE_TTL, stale_ttl=TICKER_STALE_TTL, fallback_ttl=TICKER_FALLBACK_TTL,
+                           fetch_many=fetch_tickers)
+price_hub = PriceHub(ticker_cache.get, interval=STREAM_POLL_INTERVAL)
+
 async def fetch_crypto_price(exchange_id: str, symbol: str):
     """Fetches the latest price of a cryptocurrency from an exchange."""
     try:
-        exchange = getattr(ccxt, exchange_id)()
-        loop = asyncio.get_event_loop()
-        ticker = await loop.run_in_executor(None, lambda: exchange.fetch_ticker(symbol))
+        ticker = await ticker_cache.get(exchange_id, symbol)
         return ticker['last']
-    except AttributeError:
+    except KeyError:
         raise HTTPException(status_code=500, detail=f"Exchange {exchange_id} is not supported.")
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"Exchange {exchange_id} did not respond in {UPSTREAM_TIMEOUT:.0f}s")
     except ccxt.NetworkError as e:
         raise HTTPException(status_code=500, detail=f"Network error: {str(e)}")
     except ccxt.ExchangeError as e:
@@ -128,44 +253,100 @@ async def fetch_crypto_price(exchange_id: str, symbol: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Other error: {str(e)}")
 
-async def fetch_ohlcv(exchange_id: str, crypto: str, since: datetime, timeframe: str) -> List[List]:
+async def fetch_ohlcv_upstream(exchange_id: str, symbol: str, timeframe: str, since_ms: int) -> List[List]:
+    """Fetches OHLCV rows from an exchange, bypassing the store."""
+    return await exchange_pool.call(exchange_id, 'fetch_ohlcv', symbol, timeframe, since_ms, hedge=True)
+
+ohlcv_store = OHLCVStore(fetch_ohlcv_upstream, directory=OHLCV_STORE_DIR, refresh_interval=OHLCV_REFRESH_INTERVAL)
+
+async def fetch_ohlcv(exchange_id: str, crypto: str, since: datetime, timeframe: str) -> CandleSeries:
     """Fetches OHLCV (open, high, low, close, volume) data for a cryptocurrency from an exchange."""
     symbol = f"{crypto}/USDT"
     try:
-        exchange = getattr(ccxt, exchange_id)()
         since_ms = int(since.timestamp() * 1000)
-        loop = asyncio.get_event_loop()
-        ohlcv = await loop.run_in_executor(None, lambda: exchange.fetch_ohlcv(symbol, timeframe, since_ms))
-        return ohlcv
+        return await ohlcv_store.get(exchange_id, symbol, timeframe, since_ms)
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"Exchange {exchange_id} did not respond in {UPSTREAM_TIMEOUT:.0f}s")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching OHLCV data from {exchange_id}: {str(e)}")
 
-def generate_candlestick_chart(ohlcv: List[List]) -> str:
-    """Generates candlestick chart."""
-    if not ohlcv:
+async def fetch_exchange_prices(exchange_id: str, symbols: List[str]) -> List[float]:
+    """Fetches last prices of several symbols on one exchange, NaN for symbols it does not list."""
+    exchange = await exchange_pool.get(exchange_id)
+    listed = [symbol for symbol in symbols if symbol in exchange.markets]
+    if exchange.has.get('fetchTickers') and len(listed) > 1:
+        # One request for all symbols, shared by concurrent identical requests; it also warms /compare_prices/.
+        tickers = await ticker_cache.get_many(exchange_id, listed)
+    else:
+        tickers = dict(zip(listed, await asyncio.gather(*(ticker_cache.get(exchange_id, symbol) for symbol in listed))))
+    return [tickers[symbol]['last'] if symbol in tickers and tickers[symbol].get('last') else np.nan for symbol in symbols]
+
+def chart_window(period: str) -> Tuple[datetime, str]:
+    """Returns the start time and candle timeframe of a chart period."""
+    window, timeframe = CHART_PERIODS[period]
+    return datetime.now() - window, timeframe
+
+def parse_chart_request(crypto: str, exchange: str, period: str) -> ChartRequest:
+    """Validates chart path parameters with the same rules as /get_chart/."""
+    try:
+        return ChartRequest(crypto=crypto, exchange=exchange, period=period)
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def json_response(content: dict) -> Response:
+    """Serializes a response with orjson, writing NumPy columns directly instead of validating them per item."""
+    return Response(orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY), media_type="application/json")
+
+def parse_comparison_request(crypto: str, exchange1: str, exchange2: str) -> PriceComparisonRequest:
+    """Validates streaming query parameters with the same rules as /compare_prices/."""
+    try:
+        return PriceComparisonRequest(crypto=crypto, exchange1=exchange1, exchange2=exchange2)
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def sse_events(updates: AsyncIterator[dict]) -> AsyncIterator[str]:
+    """Formats updates as Server-Sent Events with periodic keep-alive comments."""
+    async with aclosing(with_heartbeat(updates, STREAM_HEARTBEAT)) as events:
+        async for update in events:
+            if update is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"data: {json.dumps(update)}\n\n"
+
+async def generate_candlestick_chart(candles: CandleSeries, exchange: str, crypto: str, period: str,
+                                     image_format: str = "png") -> Tuple[bytes, str]:
+    """Generates candlestick chart as image bytes and its ETag."""
+    if not len(candles):
         raise ValueError("No OHLCV data available.")
 
-    df = [
-        [
-            mdates.date2num(datetime.fromtimestamp(item[0] / 1000)),
-            item[1],
-            item[2],
-            item[3],
-            item[4],
-            item[5]
-        ] for item in ohlcv
-    ]
-    df = pd.DataFrame(df, columns=['Date', 'Open', 'High', 'Low', 'Close', 'Volume'])
-    df['Date'] = pd.to_datetime(df['Date'], unit='D')
-    df = df.set_index('Date')
-    kwargs = dict(type='candle', style='yahoo', volume=True, figratio=(12, 8), title='Candlestick Chart')
-    fig, ax = mpf.plot(df, **kwargs, returnfig=True)
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png')
-    buf.seek(0)
-    plt.close(fig)
-    img_data = base64.b64encode(buf.read()).decode('utf-8')
-    return img_data
+    columns = candles.columns()
+    # The last candle is still forming, so its close is part of the key along with the window bounds.
+    key = (exchange, crypto, period, int(columns['timestamp'][0]), int(columns['timestamp'][-1]), float(columns['close'][-1]))
+    return await chart_renderer.render(key, columns, image_format)
+
+async def render_chart(chart_request: ChartRequest, image_format: str = "png") -> Tuple[bytes, str]:
+    """Fetches the candles of a chart request and renders them, mapping failures to HTTP errors."""
+    try:
+        since, timeframe = chart_window(chart_request.period)
+        candles = await fetch_ohlcv(chart_request.exchange, chart_request.crypto, since, timeframe)
+        return await generate_candlestick_chart(candles, chart_request.exchange, chart_request.crypto,
+                                                chart_request.period, image_format)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def chart_cache_headers(etag: str) -> dict:
+    """Returns the caching headers of a rendered chart."""
+    return {"ETag": f'"{etag}"', "Cache-Control": f"private, max-age={CHART_MAX_AGE}"}
+
+def is_not_modified(request: Request, cache_headers: dict) -> bool:
+    """Tells whether the client already holds the chart, so a 304 can replace it."""
+    return request.headers.get("if-none-match") == cache_headers["ETag"]
 
 
 # --- API Routers ---
@@ -201,6 +382,39 @@ class CryptoRoutes:
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
+    @router.post("/arbitrage_matrix/", response_model=ArbitrageMatrixResponse, responses={400: {"model": ErrorResponse}})
+    async def arbitrage_matrix_api(self, matrix_request: ArbitrageMatrixRequest, api_key: str = Depends(get_api_key)):
+        """Compares prices of many cryptocurrencies across many exchanges in one request."""
+        symbols = [f"{crypto}/USDT" for crypto in matrix_request.cryptos]
+        # Exchanges are queried concurrently, so the request costs as much as the slowest one.
+        results = await asyncio.gather(*(fetch_exchange_prices(exchange_id, symbols) for exchange_id in matrix_request.exchanges),
+                                       return_exceptions=True)
+        prices = np.full((len(symbols), len(matrix_request.exchanges)), np.nan)
+        errors = {}
+        for e, (exchange_id, result) in enumerate(zip(matrix_request.exchanges, results)):
+            if isinstance(result, Exception):
+                errors[exchange_id] = str(result) or type(result).__name__
+            else:
+                prices[:, e] = result
+
+        spreads = spread_matrix(prices)
+        return json_response({
+            "cryptos": matrix_request.cryptos,
+            "exchanges": matrix_request.exchanges,
+            "prices": prices,
+            "spreads": spreads,
+            "best": best_spreads(spreads, matrix_request.cryptos, matrix_request.exchanges),
+            "errors": errors,
+        })
+
+    @router.get("/stream/prices/{crypto}", response_class=StreamingResponse, responses={400: {"model": ErrorResponse}})
+    async def stream_prices_sse(self, crypto: str, exchange1: str, exchange2: str, api_key: str = Depends(get_api_key)):
+        """Streams live prices of a cryptocurrency on two exchanges and their spread as Server-Sent Events."""
+        comparison_request = parse_comparison_request(crypto, exchange1, exchange2)
+        updates = spread_updates(price_hub, comparison_request.crypto, comparison_request.exchange1, comparison_request.exchange2)
+        return StreamingResponse(sse_events(updates), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
     @router.get("/compare", response_class=HTMLResponse, include_in_schema=False)
     async def compare_prices_form(self, request: Request):
         """Displays the price comparison form."""
@@ -229,28 +443,40 @@ class CryptoRoutes:
             raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
     @router.get("/get_chart/", response_model=ChartResponse, responses={400: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
-    async def get_chart_api(self, chart_request: ChartRequest, api_key: str = Depends(get_api_key)):
+    async def get_chart_api(self, chart_request: ChartRequest, request: Request, response: Response,
+                            api_key: str = Depends(get_api_key)):
         """Generates a candlestick chart for a cryptocurrency."""
-        try:
-            if chart_request.period == "1d":
-                since = datetime.now() - timedelta(days=1)
-                timeframe = '1h'
-            elif chart_request.period == "1w":
-                since = datetime.now() - timedelta(weeks=1)
-                timeframe = '1d'
-            elif chart_request.period == "1m":
-                since = datetime.now() - timedelta(days=30)
-                timeframe = '1d'
-
-            ohlcv = await fetch_ohlcv(chart_request.exchange, chart_request.crypto, since, timeframe)
-            img_data = generate_candlestick_chart(ohlcv)
-            return ChartResponse(image_base64=img_data, crypto=chart_request.crypto, exchange=chart_request.exchange, period=chart_request.period)
-        except ValueError as e:
-            raise HTTPException(status_code=404, detail=str(e))
-        except HTTPException:
-            raise
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+        png, etag = await render_chart(chart_request)
+        cache_headers = chart_cache_headers(etag)
+        if is_not_modified(request, cache_headers):
+            return Response(status_code=304, headers=cache_headers)
+        response.headers.update(cache_headers)
+        img_data = base64.b64encode(png).decode('utf-8')
+        return ChartResponse(image_base64=img_data, crypto=chart_request.crypto, exchange=chart_request.exchange, period=chart_request.period)
+
+    @router.get("/chart_image/{exchange}/{crypto}/{period}", response_class=Response,
+                responses={200: {"content": {media_type: {} for media_type in IMAGE_MEDIA_TYPES.values()}},
+                           400: {"model": ErrorResponse}, 404: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
+    async def get_chart_image(self, request: Request, exchange: str, crypto: str, period: str, image_format: str = "png",
+                              api_key: str = Depends(get_api_key)):
+        """Returns a candlestick chart as a raw image (png, svg or webp) with caching headers."""
+        chart_request = parse_chart_request(crypto, exchange, period)
+        if image_format not in IMAGE_MEDIA_TYPES:
+            raise HTTPException(status_code=400, detail=f"Image format must be one of: {', '.join(IMAGE_MEDIA_TYPES)}")
+        image, etag = await render_chart(chart_request, image_format)
+        cache_headers = chart_cache_headers(etag)
+        if is_not_modified(request, cache_headers):
+            return Response(status_code=304, headers=cache_headers)
+        return Response(content=image, media_type=IMAGE_MEDIA_TYPES[image_format], headers=cache_headers)
+
+    @router.get("/chart_data/{exchange}/{crypto}/{period}", response_model=ChartDataResponse, responses={400: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
+    async def get_chart_data(self, exchange: str, crypto: str, period: str, api_key: str = Depends(get_api_key)):
+        """Returns compact column arrays of OHLCV data for drawing the chart in the browser."""
+        chart_request = parse_chart_request(crypto, exchange, period)
+        since, timeframe = chart_window(chart_request.period)
+        candles = await fetch_ohlcv(chart_request.exchange, chart_request.crypto, since, timeframe)
+        return json_response({"crypto": chart_request.crypto, "exchange": chart_request.exchange,
+                              "period": chart_request.period, **candles.columns()})
 
     @router.get("/chart", response_class=HTMLResponse, include_in_schema=False)
     async def get_chart_form(self, request: Request):
@@ -259,45 +485,41 @@ class CryptoRoutes:
 
     @router.post("/chart", response_class=HTMLResponse, include_in_schema=False)
     async def generate_chart_form_post(self, request: Request, crypto: str = Form(...), exchange: str = Form(...), period: str = Form(...)):
-        """Handles form submission for chart generation, redirects to the API endpoint."""
+        """Handles form submission for chart generation; the page draws the chart from the OHLCV arrays itself."""
         try:
             chart_request = ChartRequest(crypto=crypto, exchange=exchange, period=period)
-            api_response = await self.get_chart_api(chart_request, API_KEY)
+            since, timeframe = chart_window(chart_request.period)
+            candles = await fetch_ohlcv(chart_request.exchange, chart_request.crypto, since, timeframe)
+            if not len(candles):
+                raise HTTPException(status_code=404, detail="No OHLCV data available.")
 
-            return templates.TemplateResponse("chart.html", {"request": request, "img_data": api_response.image_base64, "crypto": api_response.crypto, "exchange":api_response.exchange, "period": api_response.period})
+            ohlcv = {name: column.tolist() for name, column in candles.columns().items()}
+            return templates.TemplateResponse("chart.html", {"request": request, "ohlcv": ohlcv, "crypto": chart_request.crypto, "exchange": chart_request.exchange, "period": chart_request.period})
         except HTTPException as e:
             raise e
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
-    @router.get("/ohlcv/{exchange}/{crypto}/{period}", response_model=OHLCVResponse, responses={400: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
-    async def get_ohlcv_api(self, exchange: str, crypto: str, period: str, api_key: str = Depends(get_api_key)):
-        """Retrieves OHLCV data for a cryptocurrency."""
+    @router.get("/ohlcv/{exchange}/{crypto}/{period}", response_model=OHLCVResponse,
+                responses={200: {"model": OHLCVColumnsResponse, "description": "With layout=columns"}, 400: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
+    async def get_ohlcv_api(self, exchange: str, crypto: str, period: str, layout: str = "rows", api_key: str = Depends(get_api_key)):
+        """Retrieves OHLCV data for a cryptocurrency, as one object per candle or (layout=columns) one array per field."""
         try:
             if crypto not in SUPPORTED_CRYPTOS:
                 raise HTTPException(status_code=400, detail=f"Unsupported cryptocurrency: {crypto}")
             if exchange not in SUPPORTED_EXCHANGES:
                 raise HTTPException(status_code=400, detail=f"Unsupported exchange: {exchange}")
-            if period not in ["1d", "1w", "1m"]:
+            if period not in CHART_PERIODS:
                 raise HTTPException(status_code=400, detail="Period must be one of: 1d, 1w, 1m")
 
-            if period == "1d":
-                since = datetime.now() - timedelta(days=1)
-                timeframe = '1h'
-            elif period == "1w":
-                since = datetime.now() - timedelta(weeks=1)
-                timeframe = '1d'
-            elif period == "1m":
-                since = datetime.now() - timedelta(days=30)
-                timeframe = '1d'
+            since, timeframe = chart_window(period)
+            if layout not in ("rows", "columns"):
+                raise HTTPException(status_code=400, detail="Layout must be one of: rows, columns")
 
-            ohlcv_raw = await fetch_ohlcv(exchange, crypto, since, timeframe)
-
-            ohlcv_data = [
-                OHLCVData(timestamp=item[0], open=item[1], high=item[2], low=item[3], close=item[4], volume=item[5])
-                for item in ohlcv_raw
-            ]
-            return OHLCVResponse(data=ohlcv_data)
+            candles = await fetch_ohlcv(exchange, crypto, since, timeframe)
+            if layout == "columns":
+                return json_response(candles.columns())
+            return json_response({"data": [dict(zip(OHLCV_COLUMNS, row)) for row in candles.rows()]})
 
         except HTTPException as e:
             raise
@@ -306,6 +528,29 @@ class CryptoRoutes:
 
 app.include_router(router)
 
+@app.websocket("/ws/prices/{crypto}")
+async def stream_prices_ws(websocket: WebSocket, crypto: str, exchange1: str, exchange2: str):
+    """Streams live prices of a cryptocurrency on two exchanges and their spread over a WebSocket."""
+    # Browsers cannot set headers on WebSocket requests, so the key may also come as ?api_key=.
+    api_key = websocket.headers.get(API_KEY_NAME) or websocket.query_params.get("api_key")
+    if api_key != API_KEY:
+        await websocket.close(code=1008, reason="Invalid API Key")
+        return
+    try:
+        comparison_request = parse_comparison_request(crypto, exchange1, exchange2)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=e.detail[:120])
+        return
+
+    await websocket.accept()
+    updates = spread_updates(price_hub, comparison_request.crypto, comparison_request.exchange1, comparison_request.exchange2)
+    try:
+        async with aclosing(updates):
+            async for update in updates:
+                await websocket.send_json(update)
+    except WebSocketDisconnect:
+        pass
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
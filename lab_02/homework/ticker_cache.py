@@ -0,0 +1,117 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+CacheKey = Tuple[str, str]
+BatchKey = Tuple[str, FrozenSet[str]]
+
+
+class CacheEntry(NamedTuple):
+    value: dict
+    fetched_at: float
+
+
+class TickerCache:
+    """TTL cache of fetch_ticker results keyed by (exchange, symbol) with single-flight loading."""
+
+    def __init__(self, fetch: Callable[[str, str], Awaitable[dict]], ttl: float = 2.0, stale_ttl: float = 0.0,
+                 fallback_ttl: float = 0.0,
+                 fetch_many: Optional[Callable[[str, List[str]], Awaitable[Dict[str, dict]]]] = None):
+        self.fetch = fetch
+        self.fetch_many = fetch_many
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.fallback_ttl = fallback_ttl
+        self.hits = 0
+        self.fallbacks = 0
+        self.misses = 0
+        self.upstream_calls = 0
+        self._entries: Dict[CacheKey, CacheEntry] = {}
+        self._inflight: Dict[CacheKey, asyncio.Future] = {}
+        self._inflight_batches: Dict[BatchKey, asyncio.Future] = {}
+
+    async def get(self, exchange_id: str, symbol: str) -> dict:
+        """Returns a cached ticker, coalescing concurrent misses for the same key into one upstream call."""
+        key = (exchange_id, symbol)
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry.fetched_at
+            if age < self.ttl:
+                self.hits += 1
+                return entry.value
+            if age < self.ttl + self.stale_ttl:
+                # Stale-while-revalidate: answer immediately, refresh in the background.
+                self.hits += 1
+                self._load(key)
+                return entry.value
+
+        self.misses += 1
+        try:
+            # shield() keeps a cancelled request from cancelling the fetch other callers are waiting on.
+            return await asyncio.shield(self._load(key))
+        except Exception:
+            # Upstream is failing (or its circuit is open): an older price beats no price, up to fallback_ttl.
+            if entry is None or time.monotonic() - entry.fetched_at >= self.ttl + self.stale_ttl + self.fallback_ttl:
+                raise
+            self.fallbacks += 1
+            return entry.value
+
+    async def get_many(self, exchange_id: str, symbols: List[str]) -> Dict[str, dict]:
+        """Returns tickers of several symbols, fetched by one coalesced fetch_many call unless all are cached."""
+        now = time.monotonic()
+        entries = {symbol: self._entries.get((exchange_id, symbol)) for symbol in symbols}
+        oldest = max((now - entry.fetched_at if entry is not None else float('inf') for entry in entries.values()),
+                     default=0.0)
+        if oldest < self.ttl + self.stale_ttl:
+            self.hits += 1
+            if oldest >= self.ttl:
+                self._load_many(exchange_id, symbols)
+            return {symbol: entry.value for symbol, entry in entries.items()}
+
+        self.misses += 1
+        try:
+            return await asyncio.shield(self._load_many(exchange_id, symbols))
+        except Exception:
+            if oldest >= self.ttl + self.stale_ttl + self.fallback_ttl:
+                raise
+            self.fallbacks += 1
+            return {symbol: entry.value for symbol, entry in entries.items()}
+
+    def _load(self, key: CacheKey) -> asyncio.Future:
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch_and_store(key))
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._finish(self._inflight, key, done))
+        return future
+
+    def _load_many(self, exchange_id: str, symbols: List[str]) -> asyncio.Future:
+        # Keyed by the symbol set, so identical batch requests share one call whatever the symbol order.
+        key = (exchange_id, frozenset(symbols))
+        future = self._inflight_batches.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch_many_and_store(exchange_id, symbols))
+            self._inflight_batches[key] = future
+            future.add_done_callback(lambda done: self._finish(self._inflight_batches, key, done))
+        return future
+
+    async def _fetch_and_store(self, key: CacheKey) -> dict:
+        self.upstream_calls += 1
+        value = await self.fetch(*key)
+        self._entries[key] = CacheEntry(value, time.monotonic())
+        return value
+
+    async def _fetch_many_and_store(self, exchange_id: str, symbols: List[str]) -> Dict[str, dict]:
+        self.upstream_calls += 1
+        values = await self.fetch_many(exchange_id, symbols)
+        fetched_at = time.monotonic()
+        # The batch also warms the per-symbol entries used by get().
+        for symbol, value in values.items():
+            self._entries[(exchange_id, symbol)] = CacheEntry(value, fetched_at)
+        return values
+
+    def _finish(self, inflight: dict, key: tuple, future: asyncio.Future):
+        inflight.pop(key, None)
+        # Background refreshes may have no awaiter; mark their errors as retrieved.
+        if not future.cancelled():
+            future.exception()
@@ -0,0 +1,178 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an exchange whose circuit breaker is open."""
+
+
+class AsyncTokenBucket:
+    """Request budget refilled at `rate` tokens per second, holding at most `burst` tokens."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> bool:
+        """Takes a token if one is available right now."""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    async def acquire(self):
+        """Takes a token, waiting for the refill if the budget is spent."""
+        self._refill()
+        # Reserve the token up front (the balance may go negative) so waiters are served in arrival order.
+        self.tokens -= 1
+        if self.tokens < 0:
+            try:
+                await asyncio.sleep(-self.tokens / self.rate)
+            except asyncio.CancelledError:
+                self.refund()
+                raise
+
+    def refund(self):
+        """Returns a token that was taken but not spent on a request."""
+        self.tokens += 1
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and lets one probe call through after `reset_timeout`."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+        return self.state != OPEN
+
+    def retry_in(self) -> float:
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """Gives up a probe that was cancelled before it could succeed or fail."""
+        self._probing = False
+
+
+class ExchangeGuard:
+    """Bounds concurrency, request rate and latency of calls to one exchange and stops calling it while it is failing."""
+
+    def __init__(self, name: str, max_concurrency: int = 8, rate: float = 10.0, burst: float = 5.0,
+                 timeout: float = 10.0, hedge_after: Optional[float] = None, failure_threshold: int = 5,
+                 reset_timeout: float = 30.0, is_failure: Callable[[BaseException], bool] = lambda e: True):
+        self.name = name
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+        self.is_failure = is_failure
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.bucket = AsyncTokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.calls = 0
+        self.hedges = 0
+        self.rejected = 0
+
+    async def call(self, fn: Callable[..., Awaitable[Any]], *args, hedge: bool = False) -> Any:
+        """Calls fn(*args) within the exchange's budgets; hedge only idempotent reads."""
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise CircuitOpenError(f"{self.name} is unavailable, retrying in {self.breaker.retry_in():.0f}s")
+        self.calls += 1
+        try:
+            result = await self._call(fn, args, hedge)
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception as e:
+            # An exchange that answers with an error (bad symbol, ...) is still healthy.
+            if isinstance(e, asyncio.TimeoutError) or self.is_failure(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return result
+
+    async def _attempt(self, fn: Callable[..., Awaitable[Any]], args: tuple, started: Optional[asyncio.Event] = None,
+                       reserved: bool = False) -> Any:
+        if not reserved:
+            await self.bucket.acquire()
+        try:
+            await self.semaphore.acquire()
+        except asyncio.CancelledError:
+            self.bucket.refund()
+            raise
+        try:
+            if started is not None:
+                started.set()
+            # Only the exchange's own response time counts against the timeout, not queueing for a token or slot.
+            return await asyncio.wait_for(fn(*args), self.timeout)
+        finally:
+            self.semaphore.release()
+
+    async def _call(self, fn: Callable[..., Awaitable[Any]], args: tuple, hedge: bool) -> Any:
+        started = asyncio.Event()
+        first = asyncio.ensure_future(self._attempt(fn, args, started))
+        pending = {first}
+        hedged = not hedge or self.hedge_after is None
+        error: Optional[BaseException] = None
+        try:
+            if not hedged:
+                # The hedge delay counts from when the first attempt reaches the exchange.
+                waiter = asyncio.ensure_future(started.wait())
+                try:
+                    await asyncio.wait({first, waiter}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    waiter.cancel()
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=None if hedged else self.hedge_after,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        return attempt.result()
+                    error = attempt.exception()
+                if not done and not hedged:
+                    hedged = True
+                    # A slow first attempt gets a duplicate, but only if the rate budget has a spare token.
+                    if self.bucket.try_acquire():
+                        self.hedges += 1
+                        pending.add(asyncio.ensure_future(self._attempt(fn, args, reserved=True)))
+            raise error
+        finally:
+            for attempt in pending:
+                attempt.cancel()